@@ -0,0 +1,321 @@
+"""This module benchmarks the main pipeline stages on synthetic data.
+
+Since the eye-tracking data are not public, each stage is run on synthetic
+scenes and gaze: objects random-walk through a video frame, each vanishing
+(and being replaced by a new object elsewhere) with probability churn_rate per
+frame, and gaze follows a randomly switching target object with Gaussian
+noise, lagging switch_latency frames behind each target switch.
+
+The following stages are timed across a grid of objects per frame, frames per
+video and number of participants:
+  tracker_update: CentroidTracker.update (time per frame)
+  smooth_objects: util.smooth_objects
+  forwards_backwards: hmm.forwards_backwards, with experiment1.py's HMM
+    hyperparameters
+  load_participant: load_and_preprocess_data.load_participant (per
+    participant), on synthetic files in a temporary directory
+
+Results are written as JSON, one record per (stage, parameters) pair, so that
+runs can be compared to catch scaling regressions.
+
+Example usage:
+  python benchmark.py --output benchmark_results.json
+  python benchmark.py --quick
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import centroidtracker
+from classes.experiment_frame import ExperimentFrame
+from classes.experiment_video import ExperimentVideo
+from classes.object_frame import ObjectFrame
+import experiment1
+import hmm
+import load_and_preprocess_data
+import util
+
+# Parameter grids
+NUM_OBJECTS = [2, 5, 10, 20]
+NUM_FRAMES = [100, 300, 1000]
+CHURN_RATES = [0.01, 0.05]
+NUM_PARTICIPANTS = [1, 4]
+QUICK_NUM_OBJECTS = [2, 5]
+QUICK_NUM_FRAMES = [100]
+QUICK_CHURN_RATES = [0.01]
+QUICK_NUM_PARTICIPANTS = [1]
+
+# Synthetic data parameters
+VIDEO_IDX = 1 # Video whose size synthetic frames take
+CLASS_NAMES = ['person', 'car', 'bicycle']
+MAX_SPEED = 5 # Maximum object speed, in pixels per frame
+MIN_HALF_SIZE = 20
+MAX_HALF_SIZE = 100
+GAZE_NOISE = 15 # Standard deviation, in pixels, of gaze around the target
+SWITCH_RATE = 0.01 # Probability of switching targets in each frame
+SWITCH_LATENCY = 10 # Frames for gaze to reach a new target
+FPS = 30
+EYETRACK_RATE = 60 # Eye-tracker samples per second
+
+NUM_REPEATS = 3
+
+
+def synthetic_detections(num_objects: int, num_frames: int, churn_rate: float,
+                         rng: np.random.Generator,
+                         video_idx: int = VIDEO_IDX) -> List[List[Dict]]:
+  """Generates object detector output for a synthetic scene.
+
+  Returns:
+    list, over frames, of detected objects, each a dict with 'name',
+    'percentage_probability' and 'box_points' keys, as output by
+    object_detector/ObjectDetector.py
+  """
+  height, width = util.VIDEO_SIZES[video_idx - 1]
+
+  def new_objects(n):
+    names = rng.choice(len(CLASS_NAMES), size=n)
+    centroids = rng.uniform((0, 0), (width, height), size=(n, 2))
+    velocities = rng.uniform(-MAX_SPEED, MAX_SPEED, size=(n, 2))
+    half_sizes = rng.uniform(MIN_HALF_SIZE, MAX_HALF_SIZE, size=(n, 2))
+    return names, centroids, velocities, half_sizes
+
+  names, centroids, velocities, half_sizes = new_objects(num_objects)
+  all_frames = []
+  for _ in range(num_frames):
+    # Replace vanishing objects with new ones, keeping num_objects constant
+    vanished = rng.random(num_objects) < churn_rate
+    if vanished.any():
+      (names[vanished], centroids[vanished], velocities[vanished],
+       half_sizes[vanished]) = new_objects(int(vanished.sum()))
+    centroids = np.clip(centroids + velocities, 0, (width - 1, height - 1))
+
+    boxes = np.concatenate((centroids - half_sizes, centroids + half_sizes),
+                           axis=1).astype(int)
+    all_frames.append([
+        {'name': CLASS_NAMES[name],
+         'percentage_probability': float(rng.uniform(60, 100)),
+         'box_points': tuple(box.tolist())}
+        for (name, box) in zip(names, boxes)])
+  return all_frames
+
+
+def synthetic_gaze(video_objects: List[List[ObjectFrame]],
+                   rng: np.random.Generator,
+                   switch_rate: float = SWITCH_RATE,
+                   switch_latency: int = SWITCH_LATENCY,
+                   gaze_noise: float = GAZE_NOISE,
+                   video_idx: int = VIDEO_IDX) -> ExperimentVideo:
+  """Generates a participant's gaze following a sampled target.
+
+  Args:
+    video_objects: tracked (and screen-aligned) objects in each frame
+    rng: random number generator
+    switch_rate: probability of switching targets in each frame
+    switch_latency: number of frames, after each switch, for which gaze stays
+      on the previous target
+    gaze_noise: standard deviation, in pixels, of gaze around the target
+    video_idx: index of the video
+
+  Returns:
+    experiment video whose frames record the target and gaze
+  """
+  frames = []
+  target = None
+  gazed_object = None
+  frames_since_switch = 0
+  for (frame_idx, objects_in_frame) in enumerate(video_objects):
+    if objects_in_frame and (target not in objects_in_frame
+                             or rng.random() < switch_rate):
+      target = objects_in_frame[rng.integers(len(objects_in_frame))]
+      frames_since_switch = 0
+    current_target = next((obj for obj in objects_in_frame if obj == target),
+                          None)
+    if frames_since_switch >= switch_latency or gazed_object is None:
+      gazed_object = current_target
+    else:
+      # Follow the previous target's current position, if it is still visible
+      gazed_object = next((obj for obj in objects_in_frame
+                           if obj == gazed_object), gazed_object)
+    frames_since_switch += 1
+
+    frame = ExperimentFrame(video_idx, frame_idx * 1000/FPS, frame_idx,
+                            current_target)
+    if gazed_object is None:
+      frame.set_eyetrack(float('nan'), float('nan'), float('nan'))
+    else:
+      gaze_x, gaze_y = rng.normal(gazed_object.centroid, gaze_noise)
+      frame.set_eyetrack(gaze_x, gaze_y, 3.0)
+    frames.append(frame)
+  return ExperimentVideo(video_idx, frames)
+
+
+def write_participant_files(participant_id: int, num_frames: int,
+                            data_dir: str, rng: np.random.Generator):
+  """Writes synthetic eye-tracking and stimulus CSVs for a participant, in the
+  formats read by load_and_preprocess_data."""
+  prefix = os.path.join(data_dir, str(participant_id).zfill(2))
+  start_time = 1.6e12 # ms since the epoch
+  video_duration = 1000 * num_frames/FPS
+
+  with open(prefix + '_stimulus.csv', 'w') as out_file:
+    writer = csv.writer(out_file, delimiter=',')
+    writer.writerow(['Participant ID: {}'.format(participant_id)])
+    writer.writerow(['ComputerClock_Timestamp', 'Video_Index',
+                     'Object_Detection_Threshold', 'Target_Name',
+                     'Target_Confidence', 'TargetX', 'TargetY',
+                     'TargetXRadius', 'TargetYRadius'])
+    for video_idx in load_and_preprocess_data.VIDEOS:
+      video_start = start_time + (video_idx - 1) * video_duration
+      for frame_idx in range(num_frames):
+        writer.writerow([
+            video_start + frame_idx * 1000/FPS, video_idx,
+            load_and_preprocess_data.DETECTION_THRESHOLD,
+            'person_{}'.format(frame_idx // 100), 80.0,
+            *rng.integers(0, 1000, size=2), 50, 100])
+
+  num_samples = int(len(load_and_preprocess_data.VIDEOS) * video_duration
+                    * EYETRACK_RATE/1000) + 2
+  timestamps = start_time - 1 + np.arange(num_samples) * 1000/EYETRACK_RATE
+  gaze = rng.normal(500, 100, size=(num_samples, 4))
+  # Drop out samples from one or both eyes, coded as 0.0
+  gaze[rng.random(num_samples) < 0.05, :2] = 0.0
+  gaze[rng.random(num_samples) < 0.05] = 0.0
+  with open(prefix + '_eyetracking.csv', 'w') as out_file:
+    writer = csv.writer(out_file, delimiter=',')
+    writer.writerow(['ComputerClock_Timestamp', 'LeftEye_GazeX',
+                     'LeftEye_GazeY', 'RightEye_GazeX', 'RightEye_GazeY',
+                     'LeftEye_Diam', 'RightEye_Diam'])
+    for (t, (left_x, left_y, right_x, right_y)) in zip(timestamps, gaze):
+      writer.writerow([t, left_x, left_y, right_x, right_y,
+                       3.0 if left_x else 0.0, 3.0 if right_x else 0.0])
+
+
+def _time(function: Callable[[], object], num_repeats: int) -> List[float]:
+  durations = []
+  for _ in range(num_repeats):
+    start_time = time.perf_counter()
+    function()
+    durations.append(time.perf_counter() - start_time)
+  return durations
+
+
+def _record(stage: str, params: Dict, durations: List[float],
+            num_items: Optional[int] = None) -> Dict:
+  """Summarizes the durations of a stage; if num_items is given, times are
+  per item (e.g., per frame)."""
+  per = num_items or 1
+  record = {'stage': stage, 'params': params,
+            'num_repeats': len(durations),
+            'min_seconds': min(durations)/per,
+            'median_seconds': statistics.median(durations)/per}
+  print('{:<20}{:<60}{:.3g}s'.format(stage, json.dumps(params),
+                                     record['median_seconds']))
+  return record
+
+
+def _replay_tracker(all_frames: List[List[Dict]]):
+  tracker = centroidtracker.CentroidTracker(maxDisappeared=15)
+  for frame in all_frames:
+    tracker.update([obj['box_points'] for obj in frame])
+
+
+def benchmark_scenes(num_objects_grid: List[int], num_frames_grid: List[int],
+                     churn_rate_grid: List[float], num_repeats: int,
+                     rng: np.random.Generator) -> List[Dict]:
+  results = []
+  for (num_objects, num_frames, churn_rate) in itertools.product(
+      num_objects_grid, num_frames_grid, churn_rate_grid):
+    params = {'num_objects': num_objects, 'num_frames': num_frames,
+              'churn_rate': churn_rate}
+    all_frames = synthetic_detections(num_objects, num_frames, churn_rate, rng)
+
+    results.append(_record(
+        'tracker_update', params,
+        _time(lambda: _replay_tracker(all_frames), num_repeats), num_frames))
+    results.append(_record(
+        'smooth_objects', params,
+        _time(lambda: util.smooth_objects(all_frames), num_repeats)))
+
+    video_objects = util.smooth_objects(all_frames)
+    util.align_objects_to_screen(VIDEO_IDX, video_objects)
+    experiment_video = synthetic_gaze(video_objects, rng)
+    results.append(_record(
+        'forwards_backwards', params,
+        _time(lambda: hmm.forwards_backwards(experiment1.SIGMA,
+                                             experiment1.TAU, experiment_video,
+                                             video_objects), num_repeats)))
+  return results
+
+
+def benchmark_loading(num_frames_grid: List[int],
+                      num_participants_grid: List[int], num_repeats: int,
+                      rng: np.random.Generator) -> List[Dict]:
+  results = []
+  original_data_dir = load_and_preprocess_data.experiment_data_dir
+  try:
+    for num_frames in num_frames_grid:
+      with tempfile.TemporaryDirectory() as data_dir:
+        for participant_id in range(max(num_participants_grid)):
+          write_participant_files(participant_id, num_frames, data_dir, rng)
+        load_and_preprocess_data.experiment_data_dir = data_dir + os.sep
+        for num_participants in num_participants_grid:
+          params = {'num_frames': num_frames,
+                    'num_participants': num_participants}
+          load_all = lambda: [load_and_preprocess_data.load_participant(i)
+                              for i in range(num_participants)]
+          results.append(_record('load_participant', params,
+                                 _time(load_all, num_repeats),
+                                 num_participants))
+  finally:
+    load_and_preprocess_data.experiment_data_dir = original_data_dir
+  return results
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument('--output', default='benchmark_results.json',
+                      help='JSON file to which to write results')
+  parser.add_argument('--quick', action='store_true',
+                      help='Run a small parameter grid, e.g., as a smoke test')
+  parser.add_argument('--num_repeats', type=int, default=NUM_REPEATS,
+                      help='Number of times to time each stage')
+  parser.add_argument('--seed', type=int, default=0,
+                      help='Seed for generating synthetic data')
+  args = parser.parse_args()
+
+  rng = np.random.default_rng(args.seed)
+  if args.quick:
+    grids = (QUICK_NUM_OBJECTS, QUICK_NUM_FRAMES, QUICK_CHURN_RATES,
+             QUICK_NUM_PARTICIPANTS)
+  else:
+    grids = (NUM_OBJECTS, NUM_FRAMES, CHURN_RATES, NUM_PARTICIPANTS)
+  num_objects_grid, num_frames_grid, churn_rate_grid, num_participants_grid \
+      = grids
+
+  results = benchmark_scenes(num_objects_grid, num_frames_grid,
+                             churn_rate_grid, args.num_repeats, rng)
+  results += benchmark_loading(num_frames_grid, num_participants_grid,
+                               args.num_repeats, rng)
+
+  with open(args.output, 'w') as out_file:
+    json.dump({'python_version': platform.python_version(),
+               'numpy_version': np.__version__,
+               'platform': platform.platform(),
+               'seed': args.seed,
+               'results': results}, out_file, indent=2)
+  print('Wrote {} results to {}.'.format(len(results), args.output))
+
+
+if __name__ == '__main__':
+  main()
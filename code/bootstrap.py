@@ -0,0 +1,196 @@
+"""This module gives hierarchical bootstrap confidence intervals for accuracy.
+
+Accuracies are given as a (participant X video) matrix. Each bootstrap
+resample draws participants with replacement and then, for each drawn
+participant, draws videos with replacement. Rather than looping over
+resamples, all resample indices are generated as matrices up front, and each
+replicate's statistic is computed with array operations over the resulting
+(resample X participant X video) array.
+
+Example usage:
+  intervals = bootstrap.confidence_intervals(accuracies, seed=0)
+  print(intervals.percentile, intervals.bca)
+"""
+
+from collections import namedtuple
+from typing import Callable, Optional, Tuple
+import warnings
+
+import numpy as np
+import scipy.stats
+
+NUM_RESAMPLES = 10000
+CONFIDENCE = 0.95
+
+# A statistic maps an (... X participant X video) array of accuracies to an
+# array of shape (...) or (... X K), for K-dimensional statistics
+Statistic = Callable[[np.ndarray], np.ndarray]
+
+BootstrapIntervals = namedtuple('BootstrapIntervals', [
+    # Statistic of the original accuracy matrix
+    'estimate',
+    # (lower, upper) percentile interval
+    'percentile',
+    # (lower, upper) bias-corrected and accelerated (BCa) interval
+    'bca',
+])
+
+
+def mean_accuracy(accuracies: np.ndarray) -> np.ndarray:
+  """Mean, over participants, of each participant's mean video accuracy."""
+  return np.nanmean(np.nanmean(accuracies, axis=-1), axis=-1)
+
+
+def video_mean_accuracy(accuracies: np.ndarray) -> np.ndarray:
+  """Mean accuracy of each video over participants."""
+  return np.nanmean(accuracies, axis=-2)
+
+
+def resample_indices(num_participants: int, num_videos: int,
+                     num_resamples: int, rng: np.random.Generator,
+                     resample_videos: bool = True
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+  """Generates hierarchical bootstrap resample indices.
+
+  Args:
+    num_participants: number of participants (rows) in the accuracy matrix
+    num_videos: number of videos (columns) in the accuracy matrix
+    num_resamples: number of bootstrap resamples
+    rng: random number generator
+    resample_videos: whether to resample videos within each participant; if
+      not, each resampled participant keeps all of their videos in order
+
+  Returns:
+    (num_resamples X num_participants) participant indices and
+    (num_resamples X num_participants X num_videos) video indices, which
+    together index the accuracy matrix
+  """
+  participant_idx = rng.integers(num_participants,
+                                 size=(num_resamples, num_participants))
+  if resample_videos:
+    video_idx = rng.integers(num_videos, size=(num_resamples, num_participants,
+                                               num_videos))
+  else:
+    video_idx = np.broadcast_to(np.arange(num_videos),
+                                (num_resamples, num_participants, num_videos))
+  return participant_idx, video_idx
+
+
+def bootstrap_replicates(accuracies: np.ndarray,
+                         statistic: Statistic = mean_accuracy,
+                         num_resamples: int = NUM_RESAMPLES,
+                         resample_videos: bool = True,
+                         seed: Optional[int] = None) -> np.ndarray:
+  """Computes the statistic of every hierarchical bootstrap resample.
+
+  Args:
+    accuracies: (participant X video) accuracy matrix, NaN where missing
+    statistic: statistic to compute of each resampled accuracy matrix
+    num_resamples: number of bootstrap resamples
+    resample_videos: whether to resample videos within each participant
+    seed: optional seed for the resampling
+
+  Returns:
+    array of the statistic of each resample, with resamples along axis 0
+  """
+  rng = np.random.default_rng(seed)
+  participant_idx, video_idx = resample_indices(*accuracies.shape,
+                                                num_resamples, rng,
+                                                resample_videos)
+  resampled = accuracies[participant_idx[:, :, np.newaxis], video_idx]
+  with warnings.catch_warnings():
+    # Resamples may contain only missing accuracies
+    warnings.simplefilter('ignore', category=RuntimeWarning)
+    return statistic(resampled)
+
+
+def jackknife_replicates(accuracies: np.ndarray,
+                         statistic: Statistic = mean_accuracy) -> np.ndarray:
+  """Computes the statistic with each participant left out in turn."""
+  num_participants = accuracies.shape[0]
+  # Row i of keep_idx lists every participant except i
+  keep_idx = np.array([np.delete(np.arange(num_participants), i)
+                       for i in range(num_participants)])
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore', category=RuntimeWarning)
+    return statistic(accuracies[keep_idx])
+
+
+def percentile_interval(replicates: np.ndarray,
+                        confidence: float = CONFIDENCE
+                        ) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns the (lower, upper) percentile bootstrap interval."""
+  alpha = (1 - confidence)/2
+  lower, upper = np.nanquantile(replicates, [alpha, 1 - alpha], axis=0)
+  return lower, upper
+
+
+def bca_interval(replicates: np.ndarray, estimate: np.ndarray,
+                 jackknife: np.ndarray, confidence: float = CONFIDENCE
+                 ) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns the (lower, upper) bias-corrected and accelerated interval.
+
+  Args:
+    replicates: bootstrap replicates of the statistic, along axis 0
+    estimate: statistic of the original data
+    jackknife: leave-one-out replicates of the statistic, along axis 0
+    confidence: confidence level of the interval
+  """
+  # Bias correction, from the proportion of replicates below the estimate
+  num_valid = np.sum(~np.isnan(replicates), axis=0)
+  proportion_below = ((np.sum(replicates < estimate, axis=0)
+                       + 0.5 * np.sum(replicates == estimate, axis=0))
+                      / num_valid)
+  # Keep the bias finite when the estimate lies outside all replicates
+  proportion_below = np.clip(proportion_below, 0.5/num_valid,
+                             1 - 0.5/num_valid)
+  bias = scipy.stats.norm.ppf(proportion_below)
+
+  # Acceleration, from the skewness of the jackknife replicates
+  deviations = np.nanmean(jackknife, axis=0) - jackknife
+  with np.errstate(invalid='ignore', divide='ignore'):
+    acceleration = (np.nansum(deviations**3, axis=0)
+                    / (6 * np.nansum(deviations**2, axis=0)**1.5))
+  acceleration = np.nan_to_num(acceleration)
+
+  alpha = (1 - confidence)/2
+  z = scipy.stats.norm.ppf([alpha, 1 - alpha])
+  z = z.reshape((2,) + (1,) * np.ndim(estimate))
+  adjusted = scipy.stats.norm.cdf(
+      bias + (bias + z)/(1 - acceleration * (bias + z)))
+
+  # Quantiles differ across the dimensions of a multidimensional statistic
+  sorted_replicates = np.sort(replicates, axis=0)
+  quantile_idx = np.clip(np.round(adjusted * (num_valid - 1)), 0,
+                         num_valid - 1).astype(int)
+  lower, upper = (
+      np.take_along_axis(sorted_replicates, idx[np.newaxis], axis=0)[0]
+      for idx in quantile_idx)
+  return lower, upper
+
+
+def confidence_intervals(accuracies: np.ndarray,
+                         statistic: Statistic = mean_accuracy,
+                         num_resamples: int = NUM_RESAMPLES,
+                         confidence: float = CONFIDENCE,
+                         resample_videos: bool = True,
+                         seed: Optional[int] = None) -> BootstrapIntervals:
+  """Computes percentile and BCa hierarchical bootstrap intervals.
+
+  Args:
+    accuracies: (participant X video) accuracy matrix, NaN where missing
+    statistic: statistic for which to compute intervals
+    num_resamples: number of bootstrap resamples
+    confidence: confidence level of the intervals
+    resample_videos: whether to resample videos within each participant;
+      this should be False for statistics of individual videos
+    seed: optional seed for the resampling
+  """
+  accuracies = np.asarray(accuracies, dtype=float)
+  estimate = statistic(accuracies)
+  replicates = bootstrap_replicates(accuracies, statistic, num_resamples,
+                                    resample_videos, seed)
+  jackknife = jackknife_replicates(accuracies, statistic)
+  return BootstrapIntervals(
+      estimate, percentile_interval(replicates, confidence),
+      bca_interval(replicates, estimate, jackknife, confidence))
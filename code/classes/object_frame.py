@@ -3,10 +3,24 @@
 import numpy as np
 import scipy.stats as stats
 
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
+
+# Maps each (class_name, object_index) pair to a small integer global ID, so
+# that ObjectFrames can be compared and hashed as integers
+_OBJECT_IDS: Dict[Tuple[str, int], int] = {}
+
+def _intern_object_id(class_name: str, object_index: int) -> int:
+  key = (class_name, object_index)
+  try:
+    return _OBJECT_IDS[key]
+  except KeyError:
+    return _OBJECT_IDS.setdefault(key, len(_OBJECT_IDS))
 
 class ObjectFrame:
   """Information about a single object in a single frame."""
+  __slots__ = ('class_name', 'object_index', 'object_id', 'centroid', 'size',
+               'detection_confidence')
+
   def __init__(self, class_name: str, object_index: int,
                centroid: Tuple[float, float],
                size: Tuple[float, float],
@@ -26,6 +40,7 @@ class ObjectFrame:
     """
     self.class_name = class_name
     self.object_index = object_index
+    self.object_id = _intern_object_id(class_name, object_index)
     self.centroid = centroid
     self.size = size
     self.detection_confidence = confidence
@@ -34,11 +49,20 @@ class ObjectFrame:
     """Two ObjectFrames are considered equal if they represent the same
        detected object, even if at different points in time."""
     return (isinstance(other, ObjectFrame)
-            and self.class_name == other.class_name
-            and self.object_index == other.object_index)
+            and self.object_id == other.object_id)
 
   def __hash__(self):
-    return hash((self.class_name, self.object_index))
+    return self.object_id
+
+  def __getstate__(self):
+    # Global IDs are only meaningful within a process, so re-intern on unpickle
+    return (self.class_name, self.object_index, self.centroid, self.size,
+            self.detection_confidence)
+
+  def __setstate__(self, state):
+    (self.class_name, self.object_index, self.centroid, self.size,
+     self.detection_confidence) = state
+    self.object_id = _intern_object_id(self.class_name, self.object_index)
 
   def __str__(self):
     return ('Object "{} {}" at position {}, size {}, confidence {}.'
@@ -0,0 +1,66 @@
+"""This module compares HMM accuracy under two sets of object detections.
+
+This is used, e.g., to measure how far HMM accuracy drifts when objects are
+only detected on keyframes and propagated with optical flow in between (see
+object_detector/PreDetectObjects.py), relative to detecting on every frame.
+Both sets of detections are decoded for the participants that experiment1.py
+keeps, with its SIGMA and TAU, so any accuracy difference comes from the
+detections alone.
+
+Example usage:
+  python compare_detections.py \\
+      --candidate '../data/detected_objects/keyframe5/video{video_idx:02d}_threshold60.pickle'
+"""
+
+import argparse
+
+import experiment1
+import hmm
+import metrics
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--baseline', default=experiment1.DETECTION_DATA_FNAME,
+                      help='Filename format of the baseline detections')
+  parser.add_argument('--candidate', required=True,
+                      help='Filename format of the candidate detections')
+  args = parser.parse_args()
+
+  participants = experiment1.load_participants()
+
+  baseline_accuracies = []
+  candidate_accuracies = []
+  for video_idx in experiment1.VIDEOS:
+    baseline_objects = experiment1.load_detected_objects(video_idx,
+                                                         args.baseline)
+    candidate_objects = experiment1.load_detected_objects(video_idx,
+                                                          args.candidate)
+    for participant in participants:
+      experiment_video = participant.videos[video_idx-1]
+      ground_truth = [frame.target for frame in experiment_video.frames]
+      baseline_accuracies.append(metrics.compute_accuracy(
+          hmm.forwards_backwards(experiment1.SIGMA, experiment1.TAU,
+                                 experiment_video, baseline_objects),
+          ground_truth))
+      candidate_accuracies.append(metrics.compute_accuracy(
+          hmm.forwards_backwards(experiment1.SIGMA, experiment1.TAU,
+                                 experiment_video, candidate_objects),
+          ground_truth))
+    print('Video {} accuracy: baseline {}, candidate {}'.format(
+        video_idx,
+        metrics.mean_and_ste(baseline_accuracies[-len(participants):])[0],
+        metrics.mean_and_ste(candidate_accuracies[-len(participants):])[0]))
+
+  differences = [candidate - baseline for (candidate, baseline)
+                 in zip(candidate_accuracies, baseline_accuracies)]
+  print('Baseline accuracy: {} +/- {}'.format(
+      *metrics.mean_and_ste(baseline_accuracies)))
+  print('Candidate accuracy: {} +/- {}'.format(
+      *metrics.mean_and_ste(candidate_accuracies)))
+  print('Accuracy drift (candidate - baseline): {} +/- {}'.format(
+      *metrics.mean_and_ste(differences)))
+
+
+if __name__ == '__main__':
+  main()
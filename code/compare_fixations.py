@@ -0,0 +1,80 @@
+"""This module compares frame-level and fixation-level HMM decoding.
+
+For each participant and video, the HMM is run once per frame and once per
+fixation (see fixations.py), and both decodes are scored against the targets.
+The report gives the accuracy of each, the reduction in HMM sequence length
+and the decoding time; the frame-level accuracy is that of experiment1.py.
+
+Example usage:
+  python compare_fixations.py --velocity_threshold 30
+"""
+
+import argparse
+import time
+
+import experiment1
+import fixations
+import hmm
+import metrics
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--velocity_threshold', type=float,
+                      default=fixations.VELOCITY_THRESHOLD,
+                      help='Gaze velocity (in degrees per second) below which '
+                           'gaze is fixating')
+  args = parser.parse_args()
+
+  participants = experiment1.load_participants()
+
+  frame_accuracies = []
+  fixation_accuracies = []
+  num_frames = 0
+  num_fixation_steps = 0
+  frame_time = 0.0
+  fixation_time = 0.0
+  for video_idx in experiment1.VIDEOS:
+    video_objects = experiment1.load_detected_objects(video_idx)
+    for participant in participants:
+      experiment_video = participant.videos[video_idx-1]
+      ground_truth = [frame.target for frame in experiment_video.frames]
+
+      start_time = time.perf_counter()
+      frame_mle = hmm.forwards_backwards(experiment1.SIGMA, experiment1.TAU,
+                                         experiment_video, video_objects)
+      frame_time += time.perf_counter() - start_time
+      start_time = time.perf_counter()
+      fixation_mle, num_steps = hmm.forwards_backwards_fixations(
+          experiment1.SIGMA, experiment1.TAU, experiment_video, video_objects,
+          args.velocity_threshold)
+      fixation_time += time.perf_counter() - start_time
+
+      num_frames += min(len(experiment_video.frames), len(video_objects))
+      num_fixation_steps += num_steps
+      frame_accuracies.append(metrics.compute_accuracy(frame_mle,
+                                                       ground_truth))
+      fixation_accuracies.append(metrics.compute_accuracy(fixation_mle,
+                                                          ground_truth))
+    print('Video {} accuracy: frame-level {}, fixation-level {}'.format(
+        video_idx,
+        metrics.mean_and_ste(frame_accuracies[-len(participants):])[0],
+        metrics.mean_and_ste(fixation_accuracies[-len(participants):])[0]))
+
+  differences = [fixation - frame for (fixation, frame)
+                 in zip(fixation_accuracies, frame_accuracies)]
+  print('Frame-level accuracy: {} +/- {}'.format(
+      *metrics.mean_and_ste(frame_accuracies)))
+  print('Fixation-level accuracy: {} +/- {}'.format(
+      *metrics.mean_and_ste(fixation_accuracies)))
+  print('Accuracy change (fixation - frame): {} +/- {}'.format(
+      *metrics.mean_and_ste(differences)))
+  print('HMM steps: {} frames, {} fixation steps ({:.1f}x shorter)'.format(
+      num_frames, num_fixation_steps, num_frames/num_fixation_steps))
+  print('Decoding time: frame-level {:.1f}s, fixation-level {:.1f}s '
+        '({:.1f}x faster)'.format(frame_time, fixation_time,
+                                  frame_time/fixation_time))
+
+
+if __name__ == '__main__':
+  main()
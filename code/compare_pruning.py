@@ -0,0 +1,99 @@
+"""This module compares HMM decoding with and without gaze-radius pruning.
+
+For each participant and video, the exact and pruned decodes (see
+spatial_index.py) are both scored against the targets. Since pruning never
+changes which frames are scored, the proportion of scored frames in which the
+two decodes disagree bounds how much pruning can change accuracy; this bound
+is reported alongside the observed accuracy change and the speedup. The exact
+decodes are those of experiment1.py.
+
+Example usage:
+  python compare_pruning.py --pruning_k 4
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import experiment1
+import hmm
+import metrics
+import spatial_index
+
+
+def disagreement(exact_mle, pruned_mle, ground_truth) -> float:
+  """Returns the proportion of scored frames in which two decodes differ,
+  which bounds the absolute difference between their accuracies."""
+  exact_ids = metrics.encode_objects(exact_mle)
+  pruned_ids = metrics.encode_objects(pruned_mle)
+  actual_ids = metrics.encode_objects(ground_truth)
+  num_frames = min(len(exact_ids), len(actual_ids))
+  is_scored = (metrics.grace_period_mask(actual_ids[:num_frames])
+               & (exact_ids[:num_frames] != metrics.NO_OBJECT))
+  if not is_scored.any():
+    return float('nan')
+  return np.mean(exact_ids[:num_frames][is_scored]
+                 != pruned_ids[:num_frames][is_scored])
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--pruning_k', type=float,
+                      default=spatial_index.PRUNING_K,
+                      help='Emission standard deviations within which to keep '
+                           'objects')
+  args = parser.parse_args()
+
+  participants = experiment1.load_participants()
+
+  exact_accuracies = []
+  pruned_accuracies = []
+  disagreements = []
+  exact_time = 0.0
+  pruned_time = 0.0
+  for video_idx in experiment1.VIDEOS:
+    video_objects = experiment1.load_detected_objects(video_idx)
+    video_index = spatial_index.build_video_index(video_objects)
+    for participant in participants:
+      experiment_video = participant.videos[video_idx-1]
+      ground_truth = [frame.target for frame in experiment_video.frames]
+
+      start_time = time.perf_counter()
+      exact_mle = hmm.forwards_backwards(experiment1.SIGMA, experiment1.TAU,
+                                         experiment_video, video_objects)
+      exact_time += time.perf_counter() - start_time
+      start_time = time.perf_counter()
+      pruned_mle = hmm.forwards_backwards(experiment1.SIGMA, experiment1.TAU,
+                                          experiment_video, video_objects,
+                                          args.pruning_k, video_index)
+      pruned_time += time.perf_counter() - start_time
+
+      exact_accuracies.append(metrics.compute_accuracy(exact_mle,
+                                                       ground_truth))
+      pruned_accuracies.append(metrics.compute_accuracy(pruned_mle,
+                                                        ground_truth))
+      disagreements.append(disagreement(exact_mle, pruned_mle, ground_truth))
+    print('Video {} accuracy: exact {}, pruned {}; max loss bound {}'.format(
+        video_idx,
+        metrics.mean_and_ste(exact_accuracies[-len(participants):])[0],
+        metrics.mean_and_ste(pruned_accuracies[-len(participants):])[0],
+        np.nanmax(disagreements[-len(participants):])))
+
+  differences = [pruned - exact for (pruned, exact)
+                 in zip(pruned_accuracies, exact_accuracies)]
+  print('Exact accuracy: {} +/- {}'.format(
+      *metrics.mean_and_ste(exact_accuracies)))
+  print('Pruned accuracy: {} +/- {}'.format(
+      *metrics.mean_and_ste(pruned_accuracies)))
+  print('Accuracy change (pruned - exact): {} +/- {}'.format(
+      *metrics.mean_and_ste(differences)))
+  print('Accuracy loss bound (proportion of scored frames decoded '
+        'differently): mean {}, max {}'.format(np.nanmean(disagreements),
+                                               np.nanmax(disagreements)))
+  print('Decoding time: exact {:.1f}s, pruned {:.1f}s ({:.1f}x faster)'.format(
+      exact_time, pruned_time, exact_time/pruned_time))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,237 @@
+"""This module converts video annotation JSON into object detection pickles.
+
+The Google Cloud Video Intelligence API (see object_detector/GCP/) outputs
+object tracks, each with normalized bounding boxes sampled at a few time
+offsets, in one JSON document per video. This converts them into the same
+per-frame detection format as object_detector/ObjectDetector.py (a list, over
+video frames, of dicts with 'name', 'percentage_probability' and 'box_points'
+keys), which util.smooth_objects consumes:
+  1) Boxes are scaled to pixels using the video's size in util.VIDEO_SIZES.
+  2) Each box is placed in the video frame nearest its time offset, at the
+     video's native frame rate in util.VIDEO_FRAME_RATES.
+  3) Since tracks are sampled more sparsely than video frames (e.g., every
+     0.1s), boxes are linearly interpolated over short gaps within a track.
+  4) The output has one (possibly empty) list per video frame, as in
+     util.VIDEO_NUM_FRAMES, so it aligns one-to-one with the detector's.
+
+The JSON is parsed incrementally, one object track at a time, so memory used
+for parsing is bounded by the largest track rather than the whole document.
+
+Example usage:
+  python convert_annotations.py --videos 1 2 3
+  python compare_detections.py \\
+      --candidate '../data/detected_objects/gcp/{video_idx:02d}.pickle'
+"""
+
+import argparse
+import json
+import os
+import pickle
+import re
+import sys
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+import util
+
+ANNOTATION_FNAME = 'object_detector/GCP/{video_idx:02d}_object_annotations.json'
+OUTPUT_FNAME = '../data/detected_objects/gcp/{video_idx:02d}.pickle'
+VIDEOS = range(1, 15)
+
+# Longest gap (in frames) within a track over which to interpolate boxes
+MAX_INTERPOLATION_GAP = 15
+
+_CHUNK_SIZE = 2**20
+_DECODER = json.JSONDecoder()
+_ANNOTATIONS_START = re.compile(r'"objectAnnotations"\s*:\s*\[')
+_SEPARATORS = re.compile(r'[\s,]*')
+# Enough of the end of a chunk to hold a partially read _ANNOTATIONS_START
+_MAX_START_LENGTH = 256
+
+
+def iter_object_annotations(in_file: TextIO,
+                            chunk_size: int = _CHUNK_SIZE) -> Iterator[dict]:
+  """Yields each object annotation in a video annotation JSON document.
+
+  Only the current object annotation (and one chunk of the file) is held in
+  memory at a time. Annotations of every annotation result in the document
+  are yielded, in order.
+
+  Args:
+    in_file: text file containing the output of the annotation API
+    chunk_size: number of characters to read from the file at a time
+
+  Returns:
+    iterator over the dicts of each object annotation (i.e., track)
+  """
+  buffer = ''
+  eof = False
+  in_annotations = False
+  while True:
+    if not in_annotations:
+      match = _ANNOTATIONS_START.search(buffer)
+      if match is None:
+        if eof:
+          return
+        # Keep only enough of the buffer to complete a partial match
+        chunk = in_file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[-_MAX_START_LENGTH:] + chunk
+        continue
+      buffer = buffer[match.end():]
+      in_annotations = True
+
+    start = _SEPARATORS.match(buffer).end()
+    if start == len(buffer) and not eof:
+      buffer = in_file.read(chunk_size)
+      eof = not buffer
+      continue
+    if buffer.startswith(']', start):
+      buffer = buffer[start + 1:]
+      in_annotations = False
+      continue
+    try:
+      annotation, end = _DECODER.raw_decode(buffer, start)
+    except json.JSONDecodeError:
+      if eof:
+        raise
+      # The annotation continues past the buffer, so read more of it
+      chunk = in_file.read(chunk_size)
+      eof = not chunk
+      buffer = buffer[start:] + chunk
+      continue
+    buffer = buffer[end:]
+    yield annotation
+
+
+def _parse_duration(duration: str) -> float:
+  """Returns the seconds in a JSON-encoded protobuf Duration, e.g., '0.100s'."""
+  return float(duration.rstrip('s'))
+
+
+def annotation_to_detections(annotation: dict, video_size: Tuple[int, int],
+                             fps: float,
+                             max_gap: int = MAX_INTERPOLATION_GAP
+                             ) -> Iterator[Tuple[int, Dict]]:
+  """Converts one object annotation into per-frame detections.
+
+  Args:
+    annotation: object annotation, as yielded by iter_object_annotations
+    video_size: (height, width) of the video, in pixels
+    fps: frame rate of the video, used to map time offsets to frames
+    max_gap: longest gap (in frames) between consecutive boxes of the track
+      over which to interpolate boxes
+
+  Returns:
+    iterator over (frame index, detection) pairs of the track
+  """
+  # smooth_objects compares names by identity, so equal names must be the same
+  # object across annotations
+  name = sys.intern(annotation.get('entity', {}).get('description', ''))
+  percentage_probability = 100 * annotation.get('confidence', 0.0)
+  height, width = video_size
+  scale = np.array([width, height, width, height])
+
+  samples = []
+  for frame in annotation.get('frames', []):
+    # Fields equal to zero are omitted from the JSON
+    box = frame.get('normalizedBoundingBox', {})
+    samples.append((
+        round(_parse_duration(frame.get('timeOffset', '0s')) * fps),
+        scale * np.array([box.get('left', 0.0), box.get('top', 0.0),
+                          box.get('right', 0.0), box.get('bottom', 0.0)])))
+  samples.sort(key=lambda sample: sample[0])
+
+  def detection(box):
+    return {'name': name,
+            'percentage_probability': percentage_probability,
+            'box_points': tuple(np.rint(box).astype(int).tolist())}
+
+  for (sample_idx, (frame_idx, box)) in enumerate(samples):
+    if sample_idx > 0:
+      prev_frame_idx, prev_box = samples[sample_idx - 1]
+      if prev_frame_idx == frame_idx:
+        continue
+      if frame_idx - prev_frame_idx <= max_gap:
+        for interpolated_idx in range(prev_frame_idx + 1, frame_idx):
+          weight = ((interpolated_idx - prev_frame_idx)
+                    / (frame_idx - prev_frame_idx))
+          yield (interpolated_idx,
+                 detection((1 - weight) * prev_box + weight * box))
+    yield frame_idx, detection(box)
+
+
+def convert_annotations(in_file: TextIO, video_idx: int,
+                        max_gap: int = MAX_INTERPOLATION_GAP,
+                        min_confidence: float = 0.0,
+                        num_frames: Optional[int] = None) -> List[List[Dict]]:
+  """Converts a video annotation JSON document into per-frame detections.
+
+  Args:
+    in_file: text file containing the output of the annotation API
+    video_idx: index (starting from 1) of the video, in util.VIDEO_SIZES
+    max_gap: longest gap (in frames) within a track over which to interpolate
+      boxes
+    min_confidence: minimum percentage confidence of tracks to keep
+    num_frames: number of frames in the video; by default, that in
+      util.VIDEO_NUM_FRAMES. Detections past the last frame are dropped.
+
+  Returns:
+    list, over frames, of detected objects, in the same format as
+    ObjectDetector.detect_objects
+  """
+  video_size = util.VIDEO_SIZES[video_idx - 1]
+  fps = util.VIDEO_FRAME_RATES[video_idx - 1]
+  if num_frames is None:
+    num_frames = util.VIDEO_NUM_FRAMES[video_idx - 1]
+  all_frames = [[] for _ in range(num_frames)]
+  for annotation in iter_object_annotations(in_file):
+    if 100 * annotation.get('confidence', 0.0) < min_confidence:
+      continue
+    for (frame_idx, detection) in annotation_to_detections(
+        annotation, video_size, fps, max_gap):
+      if frame_idx < num_frames:
+        all_frames[frame_idx].append(detection)
+  return all_frames
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--videos', type=int, nargs='+', default=VIDEOS,
+                      help='Indices of videos to convert')
+  parser.add_argument('--input', default=ANNOTATION_FNAME,
+                      help='Format of annotation JSON filenames')
+  parser.add_argument('--output', default=OUTPUT_FNAME,
+                      help='Format of output detection pickle filenames')
+  parser.add_argument('--max_gap', type=int, default=MAX_INTERPOLATION_GAP,
+                      help='Longest gap (in frames) within a track over which '
+                           'to interpolate boxes')
+  parser.add_argument('--min_confidence', type=float, default=0.0,
+                      help='Minimum percentage confidence of tracks to keep')
+  args = parser.parse_args()
+
+  for video_idx in args.videos:
+    input_fname = args.input.format(video_idx=video_idx)
+    if not os.path.exists(input_fname):
+      print('Skipping video {}; {} does not exist.'.format(video_idx,
+                                                          input_fname))
+      continue
+    print('Converting {}...'.format(input_fname))
+    with open(input_fname) as in_file:
+      all_frames = convert_annotations(in_file, video_idx, args.max_gap,
+                                       args.min_confidence)
+
+    # Write atomically, so that interrupted runs never leave partial outputs
+    output_fname = args.output.format(video_idx=video_idx)
+    os.makedirs(os.path.dirname(output_fname) or '.', exist_ok=True)
+    with open(output_fname + '.tmp', 'wb') as out_file:
+      pickle.dump(all_frames, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(output_fname + '.tmp', output_fname)
+    print('Output {} frames ({} detections) to {}'.format(
+        len(all_frames), sum(len(frame) for frame in all_frames),
+        output_fname))
+
+
+if __name__ == '__main__':
+  main()
@@ -3,15 +3,17 @@ import cv2 # Use OpenCV to display video
 from datetime import datetime
 import numpy as np
 import object_smoothing as object_smoothing
+import os
 import pickle
 import random
-import time
+import stimulus_cache
 import util
+from frame_scheduler import FrameScheduler
+from video_reader import Letterbox, PrefetchingVideoReader
 
 # for simplicity, in the actual experiment, we hard-coded these values
 SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1200
-_TARGET_COLOR = (0, 255, 0) # bright green
 DETECTED_OBJECTS_DIR = '../data/detected_objects/multifidelity/'
 VIDEO_DIR = '../data/MOT17_videos/'
 
@@ -30,40 +32,25 @@ def smooth_and_display_objects(video_idx, confidence_threshold):
     all_frames = pickle.load(in_file)
   target_list = object_smoothing.generate_target_list(all_frames)
 
-  video = cv2.VideoCapture(VIDEO_DIR + video_fname)
+  # Recale video to be as large as possible while fitting on screen without
+  # changing aspect ratio, and pad the remaining screen space with black space
+  letterbox = Letterbox(util.VIDEO_SIZES[video_idx - 1],
+                        (SCREEN_HEIGHT, SCREEN_WIDTH))
+
+  # Decode and rescale frames ahead of time on a background thread
+  video = PrefetchingVideoReader(VIDEO_DIR + video_fname, transform=letterbox)
 
   # Get basic video information
-  FPS = video.get(cv2.CAP_PROP_FPS) # natural frame rate
+  FPS = video.fps # natural frame rate
   print('Video framerate:' + str(FPS))
 
-  # Set the inter-frame delay based on the video's natural framerate
-  delay = 1.0/FPS
-  
+  # Schedule frames at the video's natural framerate
+  scheduler = FrameScheduler(FPS)
+
   # Set up to display the first frame
   current_frame = 0
-  videoStartTime = time.time()
   videoIsPlaying = True
   nextFrameExists, frame = video.read() # Load first video frame
-  video_height, video_width, _ = frame.shape
-
-  # Recale video to be as large as possible while fitting on screen without
-  # changing aspect ratio
-  scale = min(SCREEN_HEIGHT/video_height, SCREEN_WIDTH/video_width)
-  scaled_width = int(scale * video_width)
-  scaled_height = int(scale * video_height)
-  frame = cv2.resize(frame, (scaled_width, scaled_height)) # rescale video to fit screen
-
-  # Pad the remaining screen space with black space
-  top_padding = max(0, int((SCREEN_HEIGHT - scaled_height)/2))
-  left_padding = max(0, int((SCREEN_WIDTH - scaled_width)/2))
-  border_color = (0, 0, 0) # black border
-  frame = cv2.copyMakeBorder(frame,
-                             top_padding,
-                             SCREEN_HEIGHT - (scaled_height + top_padding),
-                             left_padding,
-                             SCREEN_WIDTH - (scaled_width + left_padding),
-                             borderType=cv2.BORDER_CONSTANT,
-                             value=border_color)
                      
   timestamped_target_list = [] # List of timestamped targets to output
   current_time = centroid = object_ID = horz_rad = \
@@ -77,51 +64,101 @@ def smooth_and_display_objects(video_idx, confidence_threshold):
 
   # While there are more frames to display, continue displaying video
   while nextFrameExists:
-    current_time = time.time()
-    if current_time > videoStartTime + current_frame * delay:
-        cv2.imshow('Video Frame', frame) # Display current frame
-        
-        # Record target and timestamp if target exists
-        if centroid is not None:
-          timestamped_target_list.append([current_time,
-                                          video_idx,
-                                          confidence_threshold,
-                                          object_ID,
-                                          target_conf,
-                                          centroid[0],
-                                          centroid[1],
-                                          horz_rad,
-                                          vert_rad])
-          
-        nextFrameExists, frame = video.read() # Load next video frame
-        cv2.waitKey(1)
-        
-        if nextFrameExists:
-          frame = cv2.resize(frame, (scaled_width, scaled_height)) # rescale video to fit screen
-          frame = cv2.copyMakeBorder(frame, top_padding, top_padding,
-                                     left_padding, left_padding,
-                                     borderType=cv2.BORDER_CONSTANT, value=0)
-
-          # Draw ellipse around and label target object
-          if target_list[current_frame] is not None: # This happens as long as there is at least one detected object on screen
-            object_ID, b, target_conf = target_list[current_frame]
-            centroid = util.calc_centroid(b)
-            centroid = (int(scale * centroid[0]) + left_padding, int(scale * centroid[1]) + top_padding)
-            horz_rad = int(scale * (b[2] - b[0])/2)
-            vert_rad = int(scale * (b[3] - b[1])/2)
-            cv2.ellipse(frame, centroid, (horz_rad, vert_rad), 0, 0, 360, color = _TARGET_COLOR, thickness = 2)
-          if fixation_point is not None:
-            cv2.ellipse(frame, fixation_point, (10, 10), 0, 0, 360, color = (0, 255, 0), thickness = 3)
-
-        current_frame += 1
+    if scheduler.is_late(current_frame):
+      # Too late to show this frame on time; skip it, but still record it
+      # (at its scheduled time), so that rows stay aligned with video frames
+      scheduler.drop(current_frame)
+      current_time = scheduler.to_wall_clock(current_frame)
+      jitter = float('nan')
+      frame_dropped = 1
+    else:
+      scheduler.wait(current_frame)
+      cv2.imshow('Video Frame', frame) # Display current frame
+      cv2.waitKey(1)
+      current_time, jitter = scheduler.record_presentation(current_frame)
+      frame_dropped = 0
+
+    # Record target and timestamp if target exists
+    if centroid is not None:
+      timestamped_target_list.append([current_time,
+                                      video_idx,
+                                      confidence_threshold,
+                                      object_ID,
+                                      target_conf,
+                                      centroid[0],
+                                      centroid[1],
+                                      horz_rad,
+                                      vert_rad,
+                                      jitter,
+                                      frame_dropped])
+
+    nextFrameExists, frame = video.read() # Load next video frame
+
+    if nextFrameExists:
+      # Draw ellipse around and label target object
+      if target_list[current_frame] is not None: # This happens as long as there is at least one detected object on screen
+        (object_ID, target_conf, centroid_x, centroid_y, horz_rad,
+         vert_rad) = stimulus_cache.draw_target(
+             frame, target_list[current_frame], letterbox)
+        centroid = (centroid_x, centroid_y)
+      if fixation_point is not None:
+        cv2.ellipse(frame, fixation_point, (10, 10), 0, 0, 360, color = (0, 255, 0), thickness = 3)
+
+    current_frame += 1
 
   video.release()
+  print(scheduler.summary())
+  print('Decoding stalled {} times.'.format(video.num_stalls))
   return timestamped_target_list
+
+def display_cached_trial(trial, video_idx, confidence_threshold):
+  """Presents a trial pre-rendered by stimulus_cache.py."""
+  print('Playing pre-rendered video {} at confidence {}'
+        .format(video_idx, confidence_threshold))
+  scheduler = FrameScheduler(trial.fps)
+  timestamped_target_list = [] # List of timestamped targets to output
+  for current_frame in range(len(trial)):
+    if scheduler.is_late(current_frame):
+      # Too late to show this frame on time; skip it, but still record it
+      # (at its scheduled time), so that rows stay aligned with video frames
+      scheduler.drop(current_frame)
+      current_time = scheduler.to_wall_clock(current_frame)
+      jitter = float('nan')
+      frame_dropped = 1
+    else:
+      scheduler.wait(current_frame)
+      cv2.imshow('Video Frame', trial.frames[current_frame]) # Display current frame
+      cv2.waitKey(1)
+      current_time, jitter = scheduler.record_presentation(current_frame)
+      frame_dropped = 0
+
+    # Record target and timestamp if target exists
+    target = trial.targets[current_frame]
+    if target is not None:
+      object_ID, target_conf, centroid_x, centroid_y, horz_rad, vert_rad = target
+      timestamped_target_list.append([current_time,
+                                      video_idx,
+                                      confidence_threshold,
+                                      object_ID,
+                                      target_conf,
+                                      centroid_x,
+                                      centroid_y,
+                                      horz_rad,
+                                      vert_rad,
+                                      jitter,
+                                      frame_dropped])
+
+  print(scheduler.summary())
+  return timestamped_target_list
+
 # Display the 14 videos in random order
 print('\nThis is the stimulus display script.\n\n')
 print('Start this 2nd!\n\n')
 participant_id = input('Enter participant ID: ')
 
+# Use trials pre-rendered for this participant by stimulus_cache.py, if any
+cache_dir = os.path.join(stimulus_cache.CACHE_DIR, participant_id)
+
 # Construct output file path
 today = '{}-{}-{}'.format(datetime.now().month, datetime.now().day,
                           datetime.now().year)
@@ -135,7 +172,8 @@ with open(file_name, 'w') as outfile:
            "Time: " + time_now]
   heading = ["ComputerClock_Timestamp", "Video_Index",
              "Object_Detection_Threshold", "Target_Name", "Target_Confidence",
-             "TargetX", "TargetY", "TargetXRadius", "TargetYRadius"]
+             "TargetX", "TargetY", "TargetXRadius", "TargetYRadius",
+             "Frame_Jitter", "Frame_Dropped"]
   writer.writerow(title)
   writer.writerow(heading)
 
@@ -168,8 +206,15 @@ with open(file_name, 'w') as outfile:
       continue
     
     # Display next video and record target data
-    output = smooth_and_display_objects(
-        video_idx=video_idx, confidence_threshold=confidence_threshold)
+    if stimulus_cache.CachedTrial.exists(cache_dir, video_idx,
+                                         confidence_threshold):
+      output = display_cached_trial(
+          stimulus_cache.CachedTrial(cache_dir, video_idx,
+                                     confidence_threshold),
+          video_idx=video_idx, confidence_threshold=confidence_threshold)
+    else:
+      output = smooth_and_display_objects(
+          video_idx=video_idx, confidence_threshold=confidence_threshold)
 
     # Display black screen for 5 seconds between each video
     cv2.imshow('Video Frame', black_screen)
@@ -1,10 +1,23 @@
-"""This module performs analyses for Experiment 1: Guided Viewing with Detected Targets."""
-import numpy as np
+"""This module performs analyses for Experiment 1: Guided Viewing with Detected Targets.
+
+The settings and functions below (loading participants and detected objects,
+evaluating one participant's video, and summarizing results) are shared by
+the other analysis scripts, so that they measure the same thing.
+"""
 import pickle
+from typing import List, Optional
+
+import numpy as np
 
+import bootstrap
+from classes.experiment_video import ExperimentVideo
+from classes.object_frame import ObjectFrame
+from classes.participant import Participant
 import hmm
+import instrumentation
 from load_and_preprocess_data import load_participant
 import metrics
+from result_store import ResultStore, hash_detections
 import util
 
 # Preprocessing parameters
@@ -14,6 +27,16 @@ MAX_MISSING_PROPORTION = 0.25
 SIGMA = 1
 TAU = 0.99
 
+# Whether to reuse stored decodes whose inputs and hyperparameters are unchanged
+USE_RESULT_STORE = True
+
+# File to which to write a per-stage timing report (None to disable timing)
+TIMING_REPORT_FNAME = None
+
+# Bootstrap parameters
+NUM_RESAMPLES = 10000
+BOOTSTRAP_SEED = 0
+
 VIDEOS = range(1, 15)
 PARTICIPANTS = [
     0,
@@ -34,54 +57,159 @@ PARTICIPANTS = [
     16,
 ]
 
-print('Parameters:')
-print('SIGMA: {}\nTAU: {}\nVIDEOS: {}\nPARTICIPANTS: {}'
-      .format(SIGMA, TAU, VIDEOS, PARTICIPANTS))
+DETECTION_DATA_FNAME = '../data/detected_objects/{video_idx:02d}.pickle'
+
 
-DETECTION_DATA_DIR = '../data/detected_objects'
+def is_included(participant: Participant) -> bool:
+  """Returns whether a participant has little enough missing data to keep."""
+  return participant.mean_proportion_missing < MAX_MISSING_PROPORTION
 
-# Load participant data
-participants = [load_participant(i) for i in PARTICIPANTS]
-print('Loaded data from {} participants.'.format(len(PARTICIPANTS)))
 
-# Discard participants with too much missing data
-participants = [participant for participant in participants
-                if participant.mean_proportion_missing < MAX_MISSING_PROPORTION]
+def load_participants(participant_ids: List[int] = PARTICIPANTS
+                      ) -> List[Participant]:
+  """Loads participants, discarding those with too much missing data."""
+  participants = [load_participant(i) for i in participant_ids]
+  print('Loaded data from {} participants.'.format(len(participant_ids)))
 
-print('Keeping {} participants: {}'
-      .format(len(participants), [p.ID for p in participants]))
+  participants = [participant for participant in participants
+                  if is_included(participant)]
+  print('Keeping {} participants: {}'
+        .format(len(participants), [p.ID for p in participants]))
+  return participants
 
-# Load object detection data
-detected_objects = []
-for video_idx in VIDEOS:
-  detection_data_fname = '{}/{}.pickle'.format(DETECTION_DATA_DIR,
-                                               str(video_idx).zfill(2))
+
+def load_detected_objects(video_idx: int,
+                          fname_format: str = DETECTION_DATA_FNAME
+                          ) -> List[List[ObjectFrame]]:
+  """Loads a video's detected objects, tracked and aligned to the screen."""
+  detection_data_fname = fname_format.format(video_idx=video_idx)
   print('Loading object detection data from {}...'.format(detection_data_fname))
-  with open(detection_data_fname, 'rb') as in_file:
+  with open(detection_data_fname, 'rb') as in_file, \
+       instrumentation.stage('unpickle'):
     all_frames = pickle.load(in_file)
   detected_video_objects = util.smooth_objects(all_frames)
   util.align_objects_to_screen(video_idx, detected_video_objects)
-  detected_objects.append(detected_video_objects)
-
-participant_accuracies = []
-for participant in participants:
-  print('Running participant {}...'.format(participant.ID))
-  participant_videos = [participant.videos[i-1] for i in VIDEOS]
-  video_accuracies = []
-  for (experiment_video, video_objects) \
-          in zip(participant_videos, detected_objects):
-
-    mle = hmm.forwards_backwards(SIGMA, TAU, experiment_video, video_objects)
-    ground_truth = [frame.target for frame in experiment_video.frames]
-    video_accuracy = metrics.compute_accuracy(mle, ground_truth)
-    print('Video {} accuracy: {}'.format(experiment_video.video_idx, video_accuracy))
-    video_accuracies.append(video_accuracy)
+  return detected_video_objects
+
+
+def evaluate_video(experiment_video: ExperimentVideo,
+                   video_objects: List[List[ObjectFrame]],
+                   result_store: Optional[ResultStore] = None,
+                   detections_digest: Optional[str] = None
+                   ) -> metrics.LabelMetrics:
+  """Decodes one participant's video and scores it against the targets.
+
+  Args:
+    experiment_video: participant data for the video
+    video_objects: tracked objects in each frame of the video
+    result_store: optional ResultStore from which to reuse unchanged decodes
+    detections_digest: optional hash_detections(video_objects), to avoid
+      rehashing the same detections for each participant
 
+  Returns:
+    metrics of the decode
+  """
+  if result_store is not None:
+    result, _ = result_store.decode_and_score(
+        SIGMA, TAU, experiment_video, video_objects, detections_digest)
+    return result.metrics
+  mle = hmm.forwards_backwards(SIGMA, TAU, experiment_video, video_objects)
+  ground_truth = [frame.target for frame in experiment_video.frames]
+  with instrumentation.stage('score'):
+    return metrics.compute_object_metrics(mle, ground_truth)
+
+
+def summarize_participant(video_metrics: List[metrics.LabelMetrics],
+                          videos: List[int] = VIDEOS) -> float:
+  """Prints a participant's accuracy in each video, and returns their mean."""
+  for (video_idx, metrics_in_video) in zip(videos, video_metrics):
+    print('Video {} accuracy: {}'.format(video_idx, metrics_in_video.accuracy))
   participant_accuracy_mean, participant_accuracy_ste = metrics.mean_and_ste(
-          video_accuracies)
+      [metrics_in_video.accuracy for metrics_in_video in video_metrics])
   print('Participant accuracy: {} +/- {}'.format(participant_accuracy_mean,
                                                  participant_accuracy_ste))
-  participant_accuracies.append(participant_accuracy_mean)
+  return participant_accuracy_mean
+
+
+def summarize(video_metrics: List[List[metrics.LabelMetrics]],
+              videos: List[int] = VIDEOS):
+  """Prints overall results, with bootstrap confidence intervals.
+
+  Args:
+    video_metrics: (participant X video) metrics of each decode
+    videos: indices of the videos, in the order of video_metrics
+  """
+  accuracy_matrix = np.array(
+      [[metrics_in_video.accuracy for metrics_in_video in participant_metrics]
+       for participant_metrics in video_metrics], dtype=float)
+  switch_latencies = [
+      latency for participant_metrics in video_metrics
+      for metrics_in_video in participant_metrics
+      for latency in metrics_in_video.switch_latencies]
+  confusion = {}
+  for participant_metrics in video_metrics:
+    for metrics_in_video in participant_metrics:
+      for (outcome, count) in metrics_in_video.confusion.items():
+        confusion[outcome] = confusion.get(outcome, 0) + count
+
+  accuracy_mean, accuracy_ste = metrics.mean_and_ste(
+      [metrics.mean_and_ste(accuracies)[0] for accuracies in accuracy_matrix])
+  print('Overall accuracy: {} +/- {}'.format(accuracy_mean, accuracy_ste))
+
+  intervals = bootstrap.confidence_intervals(
+      accuracy_matrix, num_resamples=NUM_RESAMPLES, seed=BOOTSTRAP_SEED)
+  print('Overall accuracy {:.0%} CI: percentile [{}, {}], BCa [{}, {}]'.format(
+      bootstrap.CONFIDENCE, *intervals.percentile, *intervals.bca))
+  video_intervals = bootstrap.confidence_intervals(
+      accuracy_matrix, statistic=bootstrap.video_mean_accuracy,
+      num_resamples=NUM_RESAMPLES, resample_videos=False, seed=BOOTSTRAP_SEED)
+  for (i, video_idx) in enumerate(videos):
+    print('Video {} accuracy: {} (percentile CI [{}, {}], BCa CI [{}, {}])'
+          .format(video_idx, video_intervals.estimate[i],
+                  video_intervals.percentile[0][i],
+                  video_intervals.percentile[1][i],
+                  video_intervals.bca[0][i], video_intervals.bca[1][i]))
+  print('Median switch latency: {} frames'.format(np.median(switch_latencies)))
+  print('Confusion: {}'.format(confusion))
+
+
+def main():
+  print('Parameters:')
+  print('SIGMA: {}\nTAU: {}\nVIDEOS: {}\nPARTICIPANTS: {}'
+        .format(SIGMA, TAU, VIDEOS, PARTICIPANTS))
+
+  if TIMING_REPORT_FNAME is not None:
+    instrumentation.enable()
+
+  participants = load_participants()
+
+  detected_objects = [load_detected_objects(video_idx) for video_idx in VIDEOS]
+  detection_digests = [hash_detections(video_objects)
+                       for video_objects in detected_objects]
+
+  result_store = ResultStore() if USE_RESULT_STORE else None
+
+  video_metrics = [] # (participant X video) metrics
+  for participant in participants:
+    print('Running participant {}...'.format(participant.ID))
+    participant_metrics = [
+        evaluate_video(participant.videos[video_idx-1], video_objects,
+                       result_store, detections_digest)
+        for (video_idx, video_objects, detections_digest)
+        in zip(VIDEOS, detected_objects, detection_digests)]
+    summarize_participant(participant_metrics)
+    video_metrics.append(participant_metrics)
+
+  if result_store is not None:
+    print('Reused {} stored decodes; computed {}.'.format(
+        result_store.num_hits, result_store.num_misses))
+
+  summarize(video_metrics)
+
+  if TIMING_REPORT_FNAME is not None:
+    instrumentation.print_report()
+    instrumentation.write_report(TIMING_REPORT_FNAME)
+
 
-accuracy_mean, accuracy_ste = metrics.mean_and_ste(participant_accuracies)
-print('Overall accuracy: {} +/- {}'.format(accuracy_mean, accuracy_ste))
+if __name__ == '__main__':
+  main()
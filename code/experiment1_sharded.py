@@ -0,0 +1,208 @@
+"""This module runs Experiment 1 split into shards, e.g., across cluster nodes.
+
+The (participant, video) task grid is split into num_shards interleaved
+shards. Each shard only loads the participants and videos it needs, and
+writes a self-describing partial results file (recording the analysis
+parameters and result version, the shard, the digests of the detected objects
+it used and the metrics of each of its tasks) to a shared directory. Once
+every shard has finished, the merge command checks that the partial results
+are complete and consistent, and prints the same summary as experiment1.py.
+
+Example usage:
+  python experiment1_sharded.py run --shard 3 --num_shards 16
+  python experiment1_sharded.py merge
+"""
+
+import argparse
+import glob
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import experiment1
+from load_and_preprocess_data import load_participant
+import metrics
+from result_store import RESULT_VERSION, ResultStore, hash_detections
+
+SHARD_DIR = '../data/experiment1_shards/'
+_SHARD_FNAME_FORMAT = 'shard_{shard:04d}_of_{num_shards:04d}.json'
+
+
+def _parameters() -> Dict:
+  """Parameters that every merged shard must share."""
+  return {'result_version': RESULT_VERSION,
+          'sigma': experiment1.SIGMA, 'tau': experiment1.TAU,
+          'grace_period': metrics.GRACE_PERIOD,
+          'max_missing_proportion': experiment1.MAX_MISSING_PROPORTION,
+          'participants': experiment1.PARTICIPANTS,
+          'videos': list(experiment1.VIDEOS)}
+
+
+def shard_tasks(shard: int, num_shards: int) -> List[Tuple[int, int]]:
+  """Returns the (participant, video) tasks assigned to a shard.
+
+  Tasks are assigned round-robin, so that each shard gets a similar mix of
+  participants and videos.
+  """
+  tasks = [(participant_idx, video_idx)
+           for participant_idx in experiment1.PARTICIPANTS
+           for video_idx in experiment1.VIDEOS]
+  return tasks[shard::num_shards]
+
+
+def run_shard(shard: int, num_shards: int, output_dir: str = SHARD_DIR,
+              result_store_dir: Optional[str] = None):
+  """Runs a shard's tasks and writes its partial results file.
+
+  Args:
+    shard: index (between 0 and num_shards - 1) of the shard to run
+    num_shards: total number of shards
+    output_dir: shared directory to which to write partial results
+    result_store_dir: optional shared ResultStore directory, from which to
+      reuse unchanged decodes
+  """
+  if not 0 <= shard < num_shards:
+    raise ValueError('Shard must be between 0 and {}, but was {}.'.format(
+        num_shards - 1, shard))
+  tasks = shard_tasks(shard, num_shards)
+  result_store = (ResultStore(result_store_dir)
+                  if result_store_dir is not None else None)
+
+  participants = {}
+  for participant_idx in sorted({p for (p, _) in tasks}):
+    participants[participant_idx] = load_participant(participant_idx)
+  detected_objects = {}
+  detection_digests = {}
+  for video_idx in sorted({v for (_, v) in tasks}):
+    detected_objects[video_idx] = experiment1.load_detected_objects(video_idx)
+    detection_digests[video_idx] = hash_detections(detected_objects[video_idx])
+
+  results = []
+  for (participant_idx, video_idx) in tasks:
+    participant = participants[participant_idx]
+    result = {'participant': participant_idx, 'video': video_idx,
+              'excluded': not experiment1.is_included(participant)}
+    if not result['excluded']:
+      print('Running participant {}, video {}...'.format(participant_idx,
+                                                         video_idx))
+      video_metrics = experiment1.evaluate_video(
+          participant.videos[video_idx - 1], detected_objects[video_idx],
+          result_store, detection_digests[video_idx])
+      result.update({
+          'accuracy': float(video_metrics.accuracy),
+          'per_class_accuracy': {
+              class_name: float(accuracy) for (class_name, accuracy)
+              in video_metrics.per_class_accuracy.items()},
+          'switch_latencies': [int(latency) for latency
+                               in video_metrics.switch_latencies],
+          'confusion': video_metrics.confusion,
+      })
+    results.append(result)
+
+  os.makedirs(output_dir, exist_ok=True)
+  fname = os.path.join(output_dir, _SHARD_FNAME_FORMAT.format(
+      shard=shard, num_shards=num_shards))
+  # Write atomically, so that merging never reads a partially written shard
+  with open(fname + '.tmp', 'w') as out_file:
+    json.dump({'parameters': _parameters(), 'shard': shard,
+               'num_shards': num_shards,
+               # JSON object keys are strings
+               'detection_digests': {
+                   str(video_idx): digest
+                   for (video_idx, digest) in detection_digests.items()},
+               'results': results}, out_file)
+  os.replace(fname + '.tmp', fname)
+  print('Wrote {} results to {}.'.format(len(results), fname))
+
+
+def load_shards(input_dir: str = SHARD_DIR) -> List[Dict]:
+  """Loads and checks all partial results files in a directory.
+
+  Returns:
+    the results of every task, from all shards
+
+  Raises:
+    ValueError: if shards are missing, or were run with different parameters,
+      shard counts or detected objects
+  """
+  shards = []
+  for fname in sorted(glob.glob(os.path.join(input_dir, 'shard_*.json'))):
+    with open(fname, 'r') as in_file:
+      shards.append(json.load(in_file))
+  if not shards:
+    raise ValueError('No shards found in {}.'.format(input_dir))
+
+  num_shards = shards[0]['num_shards']
+  detection_digests = {}
+  for shard in shards:
+    if shard['parameters'] != _parameters():
+      raise ValueError('Shard {} was run with parameters {}, not {}.'.format(
+          shard['shard'], shard['parameters'], _parameters()))
+    if shard['num_shards'] != num_shards:
+      raise ValueError('Found shards from runs with {} and {} shards.'.format(
+          num_shards, shard['num_shards']))
+    for (video_idx, digest) in shard['detection_digests'].items():
+      if detection_digests.setdefault(video_idx, digest) != digest:
+        raise ValueError('Shards were run with different detected objects for '
+                         'video {}.'.format(video_idx))
+  missing_shards = set(range(num_shards)) - {s['shard'] for s in shards}
+  if missing_shards:
+    raise ValueError('Missing shards {} of {}.'.format(sorted(missing_shards),
+                                                        num_shards))
+  return [result for shard in shards for result in shard['results']]
+
+
+def merge(input_dir: str = SHARD_DIR):
+  """Prints the summary of experiment1.py from complete partial results."""
+  results = {(result['participant'], result['video']): result
+             for result in load_shards(input_dir)}
+  participants = [
+      participant_idx for participant_idx in experiment1.PARTICIPANTS
+      if not results[(participant_idx, experiment1.VIDEOS[0])]['excluded']]
+  print('Keeping {} participants: {}'.format(len(participants), participants))
+
+  video_metrics = []
+  for participant_idx in participants:
+    print('Running participant {}...'.format(participant_idx))
+    participant_metrics = []
+    for video_idx in experiment1.VIDEOS:
+      result = results[(participant_idx, video_idx)]
+      participant_metrics.append(metrics.LabelMetrics(
+          result['accuracy'], result['per_class_accuracy'],
+          result['switch_latencies'], result['confusion']))
+    experiment1.summarize_participant(participant_metrics)
+    video_metrics.append(participant_metrics)
+
+  experiment1.summarize(video_metrics)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  run_parser = subparsers.add_parser('run', help='Run one shard of tasks')
+  run_parser.add_argument('--shard', type=int, required=True,
+                          help='Index (from 0) of the shard to run')
+  run_parser.add_argument('--num_shards', type=int, required=True,
+                          help='Total number of shards')
+  run_parser.add_argument('--output_dir', default=SHARD_DIR,
+                          help='Shared directory for partial results')
+  run_parser.add_argument('--result_store_dir', default=None,
+                          help='Optional shared directory of stored decodes')
+
+  merge_parser = subparsers.add_parser(
+      'merge', help='Summarize the partial results of all shards')
+  merge_parser.add_argument('--input_dir', default=SHARD_DIR,
+                            help='Shared directory of partial results')
+  args = parser.parse_args()
+
+  if args.command == 'run':
+    run_shard(args.shard, args.num_shards, args.output_dir,
+              args.result_store_dir)
+  else:
+    merge(args.input_dir)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,118 @@
+"""This module segments synchronized gaze into fixations, for the HMM.
+
+Gaze is mostly stable within fixations (typically lasting 200-400ms, i.e.,
+6-12 frames), so the HMM can decode one step per fixation rather than one per
+frame. Fixations are found with a velocity-threshold (I-VT) detector: each
+frame whose gaze moved slower than the threshold since the previous frame
+continues the previous frame's fixation. Saccade frames, and frames with
+missing gaze, each form their own single-frame segment.
+
+Within a fixation, the participant is assumed to stay on one object, so each
+object's log emission density is summed over the fixation's frames (using the
+object's position in each frame).
+
+Example usage:
+  segments = segment_fixations(experiment_video)
+  for (start, end) in segments:
+    densities = fixation_log_emission_densities(
+        gaze[start:end], video_objects[start:end], objects, sigma)
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from classes.experiment_video import ExperimentVideo
+from classes.object_frame import ObjectFrame
+
+# Assumed pixels per degree of visual angle on the stimulus screen
+PIXELS_PER_DEGREE = 40
+# Gaze velocity (in degrees per second) below which gaze is fixating
+VELOCITY_THRESHOLD = 30
+
+# A segment (start, end) spans frames start, ..., end - 1
+Segment = Tuple[int, int]
+
+
+def gaze_and_timestamps(
+    experiment_video: ExperimentVideo) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns the (N X 2) gaze and N timestamps (in ms) of a video's frames."""
+  gaze = np.array([frame.gaze for frame in experiment_video.frames],
+                  dtype=float).reshape(-1, 2)
+  timestamps = np.array([frame.t for frame in experiment_video.frames],
+                        dtype=float)
+  return gaze, timestamps
+
+
+def segment_fixations(experiment_video: ExperimentVideo,
+                      velocity_threshold: float = VELOCITY_THRESHOLD,
+                      pixels_per_degree: float = PIXELS_PER_DEGREE
+                      ) -> List[Segment]:
+  """Segments a video's frames into fixations and single saccade frames.
+
+  Args:
+    experiment_video: participant data for the video
+    velocity_threshold: gaze velocity (in degrees per second) below which
+      gaze is fixating
+    pixels_per_degree: pixels per degree of visual angle on the screen
+
+  Returns:
+    consecutive segments covering all frames of the video
+  """
+  gaze, timestamps = gaze_and_timestamps(experiment_video)
+  if len(gaze) == 0:
+    return []
+  with np.errstate(invalid='ignore', divide='ignore'):
+    # Velocity, in degrees per second, into each frame from the previous one
+    velocities = (np.linalg.norm(np.diff(gaze, axis=0), axis=1)
+                  / np.diff(timestamps) * 1000/pixels_per_degree)
+    continues_fixation = velocities < velocity_threshold
+  # NaN velocities (from missing gaze) compare as False, starting new segments
+  starts = np.flatnonzero(np.concatenate(([False], continues_fixation)) == 0)
+  ends = np.append(starts[1:], len(gaze))
+  return list(zip(starts.tolist(), ends.tolist()))
+
+
+def fixation_log_emission_densities(
+    gaze: np.ndarray, segment_objects: List[List[ObjectFrame]],
+    objects: List[ObjectFrame], sigma: float) -> Dict[ObjectFrame, float]:
+  """Sums each object's log emission density over the frames of a fixation.
+
+  An object's density in each frame is that of ObjectFrame.
+  log_emission_density at its position in that frame. If an object is
+  missing from some frames of the fixation, its summed density is rescaled
+  to the whole fixation, so that objects remain comparable.
+
+  Args:
+    gaze: (L X 2) gaze in each of the L frames of the fixation
+    segment_objects: list of objects detected in each frame of the fixation
+    objects: objects for which to compute densities
+    sigma: Scaling factor of HMM emission distribution
+
+  Returns:
+    dict mapping each object to its summed log emission density
+  """
+  object_idx = {obj.object_id : i for (i, obj) in enumerate(objects)}
+  centroids = np.full((len(gaze), len(objects), 2), np.nan)
+  sizes = np.full((len(gaze), len(objects), 2), np.nan)
+  for (frame_idx, objects_in_frame) in enumerate(segment_objects):
+    for obj in objects_in_frame:
+      i = object_idx.get(obj.object_id)
+      if i is not None:
+        centroids[frame_idx, i] = obj.centroid
+        sizes[frame_idx, i] = obj.size
+
+  # Log-density of a Gaussian with standard deviations sigma * size
+  scales = sigma * sizes
+  with np.errstate(invalid='ignore', divide='ignore'):
+    log_densities = (-0.5 * np.sum(((gaze[:, np.newaxis] - centroids)
+                                    / scales)**2, axis=2)
+                     - np.sum(np.log(scales), axis=2)
+                     - math.log(2 * math.pi))
+  # Objects missing from a frame contribute nothing in that frame
+  log_densities = np.nan_to_num(log_densities, nan=0.0)
+  num_present = np.sum(~np.isnan(centroids[:, :, 0]), axis=0)
+  summed = (np.sum(log_densities, axis=0) * len(gaze)
+            / np.maximum(num_present, 1))
+  return dict(zip(objects, np.nan_to_num(summed).tolist()))
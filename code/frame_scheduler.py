@@ -0,0 +1,97 @@
+"""This module implements a deadline-based scheduler for presenting frames.
+
+Rather than busy-waiting on the wall clock, the FrameScheduler sleeps until
+just before each frame's deadline on a monotonic clock, and then spin-waits
+only for the remainder. It records when each frame was actually presented, and
+how far this was from its deadline (its jitter), and it tells the display loop
+to drop frames that are already too late to present.
+"""
+
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+# Time (in seconds) before each deadline at which to stop sleeping and start
+# spin-waiting. This should exceed the operating system's sleep granularity.
+SPIN_TIME = 0.002
+
+
+class FrameScheduler:
+  """Schedules frames at a fixed frame rate, using a monotonic clock.
+
+  Example usage:
+    scheduler = FrameScheduler(fps)
+    for (frame_idx, frame) in enumerate(frames):
+      if scheduler.is_late(frame_idx):
+        scheduler.drop(frame_idx)
+        continue
+      scheduler.wait(frame_idx)
+      present(frame)
+      timestamp, jitter = scheduler.record_presentation(frame_idx)
+
+  Attributes:
+    presentations: list of (frame_idx, timestamp, jitter) for each presented
+      frame, where timestamp is in seconds since the epoch and jitter is the
+      delay (in seconds) of the presentation after the frame's deadline
+    dropped_frames: indices of frames that were dropped
+  """
+
+  def __init__(self, fps: float, spin_time: float = SPIN_TIME):
+    """
+    Args:
+      fps: frame rate at which to present frames
+      spin_time: time before each deadline at which to start spin-waiting
+    """
+    self._delay = 1.0/fps
+    self._spin_time = spin_time
+    self._start_time = time.perf_counter()
+    # Timestamps are reported on the wall clock, to match the eye-tracker
+    self._wall_clock_offset = time.time() - self._start_time
+    self.presentations: List[Tuple[int, float, float]] = []
+    self.dropped_frames: List[int] = []
+
+  def _deadline(self, frame_idx: int) -> float:
+    return self._start_time + frame_idx * self._delay
+
+  def to_wall_clock(self, frame_idx: int) -> float:
+    """Returns a frame's deadline, in seconds since the epoch."""
+    return self._deadline(frame_idx) + self._wall_clock_offset
+
+  def is_late(self, frame_idx: int) -> bool:
+    """Whether the next frame's deadline has already passed."""
+    return time.perf_counter() > self._deadline(frame_idx + 1)
+
+  def wait(self, frame_idx: int):
+    """Waits until a frame's deadline."""
+    deadline = self._deadline(frame_idx)
+    sleep_time = deadline - self._spin_time - time.perf_counter()
+    if sleep_time > 0:
+      time.sleep(sleep_time)
+    while time.perf_counter() < deadline:
+      pass
+
+  def record_presentation(self, frame_idx: int) -> Tuple[float, float]:
+    """Records that a frame has just been presented.
+
+    Returns:
+      (timestamp, jitter) of the presentation
+    """
+    presentation_time = time.perf_counter()
+    timestamp = presentation_time + self._wall_clock_offset
+    jitter = presentation_time - self._deadline(frame_idx)
+    self.presentations.append((frame_idx, timestamp, jitter))
+    return timestamp, jitter
+
+  def drop(self, frame_idx: int):
+    """Records that a frame was dropped."""
+    self.dropped_frames.append(frame_idx)
+
+  def summary(self) -> str:
+    jitters = np.array([jitter for (_, _, jitter) in self.presentations])
+    if len(jitters) == 0:
+      return 'No frames presented; dropped {} frames.'.format(
+          len(self.dropped_frames))
+    return ('Presented {} frames and dropped {}; jitter mean {:.2f}ms, '
+            'max {:.2f}ms.'.format(len(jitters), len(self.dropped_frames),
+                                   1000 * jitters.mean(), 1000 * jitters.max()))
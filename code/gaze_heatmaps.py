@@ -0,0 +1,162 @@
+"""This module aggregates participants' gaze into heatmaps for each video.
+
+Gaze density is accumulated in screen space, separately for each time window
+of each video, one participant at a time, so memory use is bounded by the size
+of the heatmaps rather than the number of participants. The resulting
+heatmaps are saved, so that the visualizer can blend them onto video frames
+without recomputing them. As in experiment1.py, participants with too much
+missing gaze are left out.
+
+Example usage:
+  python gaze_heatmaps.py
+"""
+
+import os
+from typing import Tuple
+
+import cv2
+import numpy as np
+import scipy.ndimage
+
+from classes.experiment_video import ExperimentVideo
+import experiment1
+from load_and_preprocess_data import load_participant
+import util
+
+HEATMAP_DIR = '../data/heatmaps/'
+BIN_SIZE = 8 # Width and height, in pixels, of each heatmap bin
+WINDOW_SIZE = 30 # Number of frames in each time window
+SMOOTHING_SIGMA = 3 # Standard deviation, in bins, of heatmap smoothing
+
+
+def gaze_array(experiment_video: ExperimentVideo) -> np.ndarray:
+  """Returns an (N X 2) array of the gaze in each of a video's N frames."""
+  return np.array([frame.gaze for frame in experiment_video.frames],
+                  dtype=float).reshape(-1, 2)
+
+
+class GazeHeatmapAccumulator:
+  """Accumulates gaze counts over screen bins and time windows of a video.
+
+  Example usage:
+    accumulator = GazeHeatmapAccumulator()
+    for participant in participants:
+      accumulator.add(gaze_array(participant.videos[video_idx-1]))
+    accumulator.save(fname)
+  """
+
+  def __init__(self, bin_size: int = BIN_SIZE,
+               window_size: int = WINDOW_SIZE,
+               screen_size: Tuple[int, int] = util.SCREEN_SIZE):
+    """
+    Args:
+      bin_size: width and height, in pixels, of each heatmap bin
+      window_size: number of frames in each time window
+      screen_size: (height, width) of the screen
+    """
+    self.bin_size = bin_size
+    self.window_size = window_size
+    self.screen_size = screen_size
+    self.counts = np.zeros((0,
+                            -(-screen_size[0] // bin_size),
+                            -(-screen_size[1] // bin_size)), dtype=np.int32)
+
+  def add(self, gaze: np.ndarray):
+    """Adds one participant's gaze for a video.
+
+    Args:
+      gaze: (N X 2) array of (x, y) gaze in each frame, NaN where missing
+    """
+    frame_idx = np.arange(len(gaze))
+    with np.errstate(invalid='ignore'):
+      valid = ((gaze[:, 0] >= 0) & (gaze[:, 0] < self.screen_size[1])
+               & (gaze[:, 1] >= 0) & (gaze[:, 1] < self.screen_size[0]))
+    window_idx = frame_idx[valid] // self.window_size
+    bins = gaze[valid].astype(int) // self.bin_size
+
+    num_windows = -(-len(gaze) // self.window_size)
+    if num_windows > len(self.counts):
+      self.counts = np.pad(self.counts,
+                           ((0, num_windows - len(self.counts)), (0, 0), (0, 0)))
+    np.add.at(self.counts, (window_idx, bins[:, 1], bins[:, 0]), 1)
+
+  def heatmaps(self, smoothing_sigma: float = SMOOTHING_SIGMA) -> np.ndarray:
+    """Returns smoothed gaze density in each time window, scaled to uint8."""
+    density = scipy.ndimage.gaussian_filter(
+        self.counts.astype(np.float32),
+        sigma=(0, smoothing_sigma, smoothing_sigma))
+    peaks = density.max(axis=(1, 2), keepdims=True)
+    return np.divide(255 * density, peaks, out=np.zeros_like(density),
+                     where=peaks > 0).astype(np.uint8)
+
+  def save(self, fname: str, smoothing_sigma: float = SMOOTHING_SIGMA):
+    np.savez_compressed(fname, counts=self.counts,
+                        heatmaps=self.heatmaps(smoothing_sigma),
+                        bin_size=self.bin_size, window_size=self.window_size)
+
+
+class HeatmapBlender:
+  """Blends saved gaze heatmaps onto screen-sized video frames.
+
+  The colored heatmap of each time window is only resized to the screen once,
+  when playback first reaches that window.
+  """
+
+  def __init__(self, fname: str, alpha: float = 0.5,
+               screen_size: Tuple[int, int] = util.SCREEN_SIZE):
+    """
+    Args:
+      fname: file to which heatmaps were saved by GazeHeatmapAccumulator
+      alpha: opacity of the heatmap
+      screen_size: (height, width) of the screen
+    """
+    with np.load(fname) as data:
+      self._heatmaps = data['heatmaps']
+      self._window_size = int(data['window_size'])
+    self._alpha = alpha
+    self._screen_size = screen_size
+    self._window_idx = None
+    self._overlay = None
+
+  def blend(self, frame: np.ndarray, frame_idx: int):
+    """Blends the heatmap of the window containing frame_idx onto frame."""
+    window_idx = frame_idx // self._window_size
+    if window_idx >= len(self._heatmaps):
+      return
+    if window_idx != self._window_idx:
+      self._window_idx = window_idx
+      colored = cv2.applyColorMap(self._heatmaps[window_idx], cv2.COLORMAP_JET)
+      # Leave regions nobody looked at uncolored
+      colored[self._heatmaps[window_idx] == 0] = 0
+      self._overlay = cv2.resize(colored, (self._screen_size[1],
+                                           self._screen_size[0]))
+    cv2.addWeighted(frame, 1.0, self._overlay, self._alpha, 0, dst=frame)
+
+
+def heatmap_fname(video_idx: int) -> str:
+  return os.path.join(HEATMAP_DIR, str(video_idx).zfill(2) + '_heatmaps.npz')
+
+
+def main():
+  accumulators = {video_idx : GazeHeatmapAccumulator()
+                  for video_idx in experiment1.VIDEOS}
+
+  # Only one participant's data is held in memory at a time
+  for participant_idx in experiment1.PARTICIPANTS:
+    participant = load_participant(participant_idx)
+    if not experiment1.is_included(participant):
+      print('Skipping participant {}, who has too much missing data.'.format(
+          participant_idx))
+      continue
+    for video_idx in experiment1.VIDEOS:
+      accumulators[video_idx].add(gaze_array(participant.videos[video_idx-1]))
+
+  os.makedirs(HEATMAP_DIR, exist_ok=True)
+  for (video_idx, accumulator) in accumulators.items():
+    accumulator.save(heatmap_fname(video_idx))
+    print('Saved heatmaps for video {} to {}.'.format(
+        video_idx, heatmap_fname(video_idx)))
+
+
+if __name__ == '__main__':
+  main()
@@ -4,9 +4,12 @@
 from collections import namedtuple
 import numpy
 import math
-from typing import Dict, List, NewType, Tuple
+from typing import Dict, List, NewType, Optional, Tuple
 
 from classes.object_frame import ObjectFrame
+import fixations
+import instrumentation
+import spatial_index
 
 # A single cell in the dynamic programming table
 Cell = namedtuple('Cell', ['partial_max_log_likelihood', 'predecessor'])
@@ -25,50 +28,89 @@ class _HMM:
       hmm.forwards_update(experiment_frame.gaze, objects_in_frame)
     mle = hmm.backwards()
 
+  If pruning_k is given, then in each frame only objects within pruning_k
+  emission standard deviations of the gaze are considered as states (see
+  spatial_index.py), which approximates the exact decode.
+
   Hidden Attributes:
     log_likelihood_table: (List[FrameTable]) for each frame, a dict mapping each
       object to its partial maximum log-likelihood and most likely predecessor
   """
 
-  def __init__(self, sigma: float, tau: float):
+  def __init__(self, sigma: float, tau: float,
+               pruning_k: Optional[float] = None):
     """
     Args:
       tau: Nominal probability that the participant stays on the same object
         between two consecutive frames.
       sigma: Scaling factor of HMM emission distribution
+      pruning_k: Optional number of emission standard deviations from the
+        gaze within which to consider objects
     """
     self.sigma = sigma
     self.tau = tau
+    self.pruning_k = pruning_k
     self.log_likelihood_table = []
 
   def forwards_update(self, gaze: Tuple[float, float],
-                      objects_in_frame: List[ObjectFrame]):
+                      objects_in_frame: List[ObjectFrame],
+                      frame_index: Optional[spatial_index.FrameIndex] = None,
+                      log_emission_densities: Optional[
+                          Dict[ObjectFrame, float]] = None):
     """Performs an update step of the forwards algorithm based on input data.
 
     Args:
       experiment_frame: a single frame of participant data
       objects_in_frame: list of objects detected in frame
+      frame_index: spatial index of objects_in_frame, used when pruning
+      log_emission_densities: optional precomputed log emission density of
+        each object (e.g., aggregated over the frames of a fixation); by
+        default, each object's density at gaze is used
     """
+    candidates = objects_in_frame
+    if (self.pruning_k is not None
+        and not (math.isnan(gaze[0]) or math.isnan(gaze[1]))):
+      if frame_index is None:
+        frame_index = spatial_index.FrameIndex(objects_in_frame)
+      candidates = frame_index.candidates(gaze, self.sigma, self.pruning_k)
 
     if not self.log_likelihood_table:
       # This is the first frame; only use emission probabilities
       new_frame_table = {}
-      for obj in objects_in_frame:
-        new_frame_table[obj] = Cell(obj.log_emission_density(gaze, self.sigma),
-                                    None)
+      for obj in candidates:
+        new_frame_table[obj] = Cell(
+            log_emission_densities[obj] if log_emission_densities is not None
+            else obj.log_emission_density(gaze, self.sigma), None)
     else:
       new_frame_table = self._compute_next_frame_table(
-          self.log_likelihood_table[-1], gaze, objects_in_frame)
+          self.log_likelihood_table[-1], gaze, objects_in_frame, candidates,
+          log_emission_densities)
     self.log_likelihood_table.append(new_frame_table)
 
   def _compute_next_frame_table(
           self, prev_frame_table: FrameTable, gaze: Tuple[float, float],
-          objects_in_frame: List[ObjectFrame]):
+          objects_in_frame: List[ObjectFrame],
+          candidates: Optional[List[ObjectFrame]] = None,
+          log_emission_densities: Optional[Dict[ObjectFrame, float]] = None):
     """Computes a frame_table using a previous frame table.
 
+    Since the transition probability from each previous object only depends
+    on whether it stays on the same object, switches to another object or has
+    vanished, the most likely predecessor of each new object is one of (1)
+    that same object, (2) the most likely other previous object still in the
+    frame, or (3) the most likely vanished object. Thus, only the two most
+    likely remaining and the most likely vanished previous objects are
+    needed, and each frame takes time linear in the number of objects.
+
     Args:
       prev_frame_table: log-likelihood table from previous frame
       gaze: (x, y) coordinates of gaze
+      objects_in_frame: list of objects detected in frame
+      candidates: subset of objects_in_frame to consider as states (by
+        default, all of them); transition probabilities still depend on all
+        objects_in_frame
+      log_emission_densities: optional precomputed log emission density of
+        each candidate
 
     NOTE: Depending on sigma and tau, this implementation may bias transitions
     to frames where the tracked object disappears.
@@ -76,33 +118,68 @@ class _HMM:
     num_new_objects = len(objects_in_frame)
     if math.isnan(gaze[0]) or math.isnan(gaze[1]):
       return {None : Cell(0.0, None)}
-    new_frame_table = {obj : Cell(float('-inf'), None)
-                       for obj in objects_in_frame}
-
-    for prev_obj in prev_frame_table:
+    if num_new_objects == 0:
+      return {}
+    if candidates is None:
+      candidates = objects_in_frame
+    instrumentation.count('decode',
+                          transitions=len(prev_frame_table) + len(candidates))
+    ids_in_frame = {obj.object_id for obj in objects_in_frame}
 
-      prev_obj_partial_log_likelihood = \
-              prev_frame_table[prev_obj].partial_max_log_likelihood
-      prev_obj_in_new_frame = (prev_obj in objects_in_frame)
+    log_stay_probability = math.log(self.tau)
+    # Switching only occurs if there is >1 object, so we don't divide by 0
+    log_switch_probability = (
+        math.log((1 - self.tau)/(num_new_objects - 1))
+        if num_new_objects > 1 else None)
+    log_vanished_probability = math.log(1/num_new_objects)
 
-      for new_obj in objects_in_frame:
+    # Each previous object is summarized as (order, object, partial max
+    # log-likelihood), where order is its position in prev_frame_table. Ties
+    # go to the earliest object, as when maximizing over all pairs of previous
+    # and new objects in order (see hmm_test.py).
+    remaining = {}
+    best = second_best = best_vanished = None
+    for (order, (prev_obj, cell)) in enumerate(prev_frame_table.items()):
+      entry = (order, prev_obj, cell.partial_max_log_likelihood)
+      if prev_obj is not None and prev_obj.object_id in ids_in_frame:
+        remaining[prev_obj.object_id] = entry
+        if best is None or entry[2] > best[2]:
+          best, second_best = entry, best
+        elif second_best is None or entry[2] > second_best[2]:
+          second_best = entry
+      elif best_vanished is None or entry[2] > best_vanished[2]:
+        best_vanished = entry
 
-        if prev_obj_in_new_frame and prev_obj == new_obj:
-          transition_probability = self.tau
-        elif prev_obj_in_new_frame:
-          # This case only occurs if there is >1 object, so we don't divide by 0
-          transition_probability = (1 - self.tau)/(num_new_objects - 1)
-        else:
-          transition_probability = 1/num_new_objects
+    new_frame_table = {}
+    for new_obj in candidates:
+      predecessors = []
+      if new_obj.object_id in remaining:
+        predecessors.append((remaining[new_obj.object_id],
+                             log_stay_probability))
+      if best is not None and best[1].object_id == new_obj.object_id:
+        other = second_best
+      else:
+        other = best
+      if other is not None:
+        predecessors.append((other, log_switch_probability))
+      if best_vanished is not None:
+        predecessors.append((best_vanished, log_vanished_probability))
 
+      if log_emission_densities is not None:
+        log_emission_density = log_emission_densities[new_obj]
+      else:
+        log_emission_density = new_obj.log_emission_density(gaze, self.sigma)
+      new_cell = Cell(float('-inf'), None)
+      for ((_, prev_obj, prev_obj_partial_log_likelihood),
+           log_transition_probability) in sorted(predecessors,
+                                                 key=lambda p: p[0][0]):
         new_partial_log_likelihood = (
             prev_obj_partial_log_likelihood
-            + math.log(transition_probability)
-            + new_obj.log_emission_density(gaze, self.sigma))
-
-        if (new_partial_log_likelihood
-            > new_frame_table[new_obj].partial_max_log_likelihood):
-          new_frame_table[new_obj] = Cell(new_partial_log_likelihood, prev_obj)
+            + log_transition_probability
+            + log_emission_density)
+        if new_partial_log_likelihood > new_cell.partial_max_log_likelihood:
+          new_cell = Cell(new_partial_log_likelihood, prev_obj)
+      new_frame_table[new_obj] = new_cell
     return new_frame_table
 
   def backwards(self) -> List[ObjectFrame]:
@@ -114,29 +191,72 @@ class _HMM:
 
     mle_backwards = []
 
-    # Get most likely final state
-    frame_table = self.log_likelihood_table[-1]
-    current = max(frame_table, key=max_likelihood_key(frame_table),
-                  default=None)
-
-    restart = False
+    # Start from the most likely final state. Whenever a state has no
+    # predecessor (e.g., after missing gaze), restart from the most likely
+    # state of the preceding frame.
+    current = None
     for frame_table in self.log_likelihood_table[::-1]:
-      mle_backwards.append(current)
-      if restart:
+      if current is None:
         current = max(frame_table, key=max_likelihood_key(frame_table),
                       default=None)
-      else:
+      mle_backwards.append(current)
+      if current is not None:
         current = frame_table[current].predecessor
 
-      if current is None:
-        restart = True
-
     return mle_backwards[::-1]
 
-def forwards_backwards(sigma, tau, experiment_video, video_objects):
-    trial_hmm = _HMM(sigma, tau)
-    for (experiment_frame_data, detected_objects_in_frame) \
-        in zip(experiment_video.frames, video_objects):
+@instrumentation.timed('decode')
+def forwards_backwards(sigma, tau, experiment_video, video_objects,
+                       pruning_k=None, video_index=None):
+    """Computes the maximum likelihood object sequence of a video.
+
+    Args:
+      pruning_k: Optional number of emission standard deviations from the gaze
+        within which to consider objects in each frame (see spatial_index.py)
+      video_index: Optional spatial index of video_objects, as built by
+        spatial_index.build_video_index, to reuse across participants when
+        pruning
+    """
+    instrumentation.count('decode', frames=len(experiment_video.frames))
+    trial_hmm = _HMM(sigma, tau, pruning_k)
+    if video_index is None:
+      video_index = [None] * len(video_objects)
+    for (experiment_frame_data, detected_objects_in_frame, frame_index) \
+        in zip(experiment_video.frames, video_objects, video_index):
       trial_hmm.forwards_update(experiment_frame_data.gaze,
-                          detected_objects_in_frame)
+                          detected_objects_in_frame, frame_index)
     return trial_hmm.backwards()
+
+def forwards_backwards_fixations(sigma, tau, experiment_video, video_objects,
+                                 velocity_threshold=fixations.VELOCITY_THRESHOLD):
+    """Computes the maximum likelihood object sequence of a video, decoding
+    one HMM step per fixation (see fixations.py) rather than per frame.
+
+    The objects in each fixation's middle frame are its possible states, and
+    the object decoded for a fixation is assigned to all of its frames.
+
+    Returns:
+      (per-frame maximum likelihood object sequence, number of HMM steps)
+    """
+    segments = fixations.segment_fixations(experiment_video,
+                                           velocity_threshold)
+    gaze, _ = fixations.gaze_and_timestamps(experiment_video)
+    instrumentation.count('decode', frames=len(experiment_video.frames))
+    trial_hmm = _HMM(sigma, tau)
+    for (start, end) in segments:
+      objects_in_fixation = video_objects[(start + end - 1)//2]
+      log_emission_densities = fixations.fixation_log_emission_densities(
+          gaze[start:end], video_objects[start:end], objects_in_fixation,
+          sigma)
+      trial_hmm.forwards_update(tuple(gaze[start:end].mean(axis=0)),
+                                objects_in_fixation,
+                                log_emission_densities=log_emission_densities)
+    fixation_mle = trial_hmm.backwards()
+
+    # Within each fixation, use the decoded object's position in each frame
+    mle = []
+    for ((start, end), obj) in zip(segments, fixation_mle):
+      for objects_in_frame in video_objects[start:end]:
+        mle.append(next((frame_obj for frame_obj in objects_in_frame
+                         if frame_obj == obj), obj))
+    return mle, len(segments)
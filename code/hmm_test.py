@@ -0,0 +1,148 @@
+"""This module tests the HMM decoder in hmm.py.
+
+Example usage:
+  python -m unittest hmm_test
+"""
+
+import math
+import random
+import unittest
+
+from classes.experiment_frame import ExperimentFrame
+from classes.experiment_video import ExperimentVideo
+from classes.object_frame import ObjectFrame
+import hmm
+
+SIGMA = 1
+TAU = 0.99
+
+_NAN = float('nan')
+
+
+def _random_frames(rng, num_frames, num_objects):
+  """Returns random (gaze, objects_in_frame) pairs, including frames with
+  missing gaze and frames without objects."""
+  frames = []
+  for _ in range(num_frames):
+    objects_in_frame = [
+        ObjectFrame('person', object_index,
+                    (rng.uniform(0, 1920), rng.uniform(0, 1200)),
+                    (rng.uniform(10, 100), rng.uniform(10, 100)))
+        for object_index in range(num_objects) if rng.random() < 0.7]
+    if rng.random() < 0.1:
+      objects_in_frame = []
+    if rng.random() < 0.1:
+      gaze = (_NAN, _NAN)
+    else:
+      gaze = (rng.uniform(0, 1920), rng.uniform(0, 1200))
+    frames.append((gaze, objects_in_frame))
+  return frames
+
+
+def _compute_next_frame_table_all_pairs(prev_frame_table, gaze,
+                                        objects_in_frame):
+  """Computes a frame table by maximizing over all pairs of objects.
+
+  This is a quadratic-time reference implementation of
+  hmm._HMM._compute_next_frame_table, which it should match exactly.
+  """
+  num_new_objects = len(objects_in_frame)
+  if math.isnan(gaze[0]) or math.isnan(gaze[1]):
+    return {None : hmm.Cell(0.0, None)}
+  new_frame_table = {obj : hmm.Cell(float('-inf'), None)
+                     for obj in objects_in_frame}
+  ids_in_frame = {obj.object_id for obj in objects_in_frame}
+
+  for prev_obj in prev_frame_table:
+
+    prev_obj_partial_log_likelihood = \
+            prev_frame_table[prev_obj].partial_max_log_likelihood
+    prev_obj_in_new_frame = (prev_obj is not None
+                             and prev_obj.object_id in ids_in_frame)
+
+    for new_obj in objects_in_frame:
+
+      if prev_obj_in_new_frame and prev_obj.object_id == new_obj.object_id:
+        transition_probability = TAU
+      elif prev_obj_in_new_frame:
+        # This case only occurs if there is >1 object, so we don't divide by 0
+        transition_probability = (1 - TAU)/(num_new_objects - 1)
+      else:
+        transition_probability = 1/num_new_objects
+
+      new_partial_log_likelihood = (
+          prev_obj_partial_log_likelihood
+          + math.log(transition_probability)
+          + new_obj.log_emission_density(gaze, SIGMA))
+
+      if (new_partial_log_likelihood
+          > new_frame_table[new_obj].partial_max_log_likelihood):
+        new_frame_table[new_obj] = hmm.Cell(new_partial_log_likelihood,
+                                            prev_obj)
+  return new_frame_table
+
+
+class ComputeNextFrameTableTest(unittest.TestCase):
+
+  def assert_tables_equal(self, prev_frame_table, gaze, objects_in_frame):
+    trial_hmm = hmm._HMM(SIGMA, TAU)
+    linear_table = trial_hmm._compute_next_frame_table(
+        prev_frame_table, gaze, objects_in_frame)
+    all_pairs_table = _compute_next_frame_table_all_pairs(
+        prev_frame_table, gaze, objects_in_frame)
+    self.assertEqual(list(linear_table), list(all_pairs_table))
+    for obj in linear_table:
+      self.assertAlmostEqual(linear_table[obj].partial_max_log_likelihood,
+                             all_pairs_table[obj].partial_max_log_likelihood)
+      self.assertIs(linear_table[obj].predecessor,
+                    all_pairs_table[obj].predecessor)
+    return linear_table
+
+  def test_empty_frame(self):
+    prev_frame_table = {ObjectFrame('person', 0, (100, 100), (10, 10)):
+                        hmm.Cell(-1.0, None)}
+    self.assertEqual(
+        self.assert_tables_equal(prev_frame_table, (100, 100), []), {})
+
+  def test_matches_all_pairs(self):
+    rng = random.Random(0)
+    trial_hmm = hmm._HMM(SIGMA, TAU)
+    for (gaze, objects_in_frame) in _random_frames(rng, 500, 6):
+      if trial_hmm.log_likelihood_table:
+        self.assert_tables_equal(trial_hmm.log_likelihood_table[-1], gaze,
+                                 objects_in_frame)
+      trial_hmm.forwards_update(gaze, objects_in_frame)
+
+
+class ForwardsBackwardsTest(unittest.TestCase):
+
+  def test_decodes_video_with_empty_frame(self):
+    obj = ObjectFrame('person', 0, (100, 100), (10, 10))
+    video_objects = [[obj], [], [obj]]
+    frames = []
+    for frame_idx in range(len(video_objects)):
+      frame = ExperimentFrame(1, frame_idx * 1000/30, frame_idx, obj)
+      frame.set_eyetrack(100, 100, 3.0)
+      frames.append(frame)
+    mle = hmm.forwards_backwards(SIGMA, TAU, ExperimentVideo(1, frames),
+                                 video_objects)
+    self.assertEqual(len(mle), len(video_objects))
+
+  def test_backtracks_through_missing_gaze(self):
+    left = ObjectFrame('person', 0, (100, 100), (10, 10))
+    right = ObjectFrame('person', 1, (1000, 1000), (10, 10))
+    gazes = [(100, 100), (100, 100), (_NAN, _NAN), (1000, 1000),
+             (1000, 1000), (_NAN, _NAN), (100, 100), (100, 100)]
+    frames = []
+    for (frame_idx, gaze) in enumerate(gazes):
+      frame = ExperimentFrame(1, frame_idx * 1000/30, frame_idx, None)
+      frame.set_eyetrack(gaze[0], gaze[1], 3.0)
+      frames.append(frame)
+    mle = hmm.forwards_backwards(SIGMA, TAU, ExperimentVideo(1, frames),
+                                 [[left, right]] * len(gazes))
+    # Each stretch of valid gaze is backtracked from its own final frame
+    self.assertEqual(mle, [left, left, None, right, right, None, left, left])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,132 @@
+"""This module implements lightweight per-stage timing of the pipeline.
+
+Pipeline functions are wrapped in named stages, either with the timed
+decorator or the stage context manager, and may count the items (e.g.,
+frames, objects or state transitions) that they process. When timing is
+disabled (the default), each of these costs only a check of a global flag.
+When enabled, the wall time, number of calls and item counts of each stage
+are accumulated, and can be written as a JSON report.
+
+Example usage:
+  instrumentation.enable()
+  ...  # Run the pipeline
+  instrumentation.write_report('timing.json')
+"""
+
+import collections
+import functools
+import json
+import time
+from typing import Callable, Dict
+
+_enabled = False
+_start_time = None
+
+# Maps each stage name to its total seconds, number of calls and item counts
+_stages: Dict[str, Dict[str, float]] = collections.defaultdict(
+    lambda: collections.defaultdict(float))
+
+
+def enable():
+  """Enables timing, discarding any previously recorded timings."""
+  global _enabled, _start_time
+  _enabled = True
+  _start_time = time.perf_counter()
+  _stages.clear()
+
+
+def disable():
+  global _enabled
+  _enabled = False
+
+
+def is_enabled() -> bool:
+  return _enabled
+
+
+def count(stage_name: str, **items: int):
+  """Adds to the number of items (e.g., frames=100) processed by a stage."""
+  if _enabled:
+    stage_items = _stages[stage_name]
+    for (item_name, num_items) in items.items():
+      stage_items[item_name] += num_items
+
+
+class _Stage:
+  """Context manager that records the wall time of a stage."""
+
+  def __init__(self, name: str):
+    self._name = name
+
+  def __enter__(self):
+    self._start_time = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info):
+    stage = _stages[self._name]
+    stage['seconds'] += time.perf_counter() - self._start_time
+    stage['calls'] += 1
+    return False
+
+
+class _NullStage:
+  """Context manager that does nothing, used when timing is disabled."""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    return False
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+  """Returns a context manager timing the enclosed code as a stage."""
+  return _Stage(name) if _enabled else _NULL_STAGE
+
+
+def timed(name: str) -> Callable:
+  """Decorator timing each call of the decorated function as a stage."""
+  def decorator(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      if not _enabled:
+        return function(*args, **kwargs)
+      with _Stage(name):
+        return function(*args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def report() -> Dict:
+  """Returns the recorded timings of each stage.
+
+  Note that stages may be nested (e.g., load_participant includes
+  synchronize), so stage times need not sum to the total time.
+  """
+  total_seconds = (time.perf_counter() - _start_time
+                   if _start_time is not None else 0.0)
+  return {
+      'total_seconds': total_seconds,
+      'stages': {name: {item_name: (value if item_name == 'seconds'
+                                    else int(value))
+                        for (item_name, value) in stage_items.items()}
+                 for (name, stage_items) in _stages.items()},
+  }
+
+
+def write_report(fname: str):
+  with open(fname, 'w') as out_file:
+    json.dump(report(), out_file, indent=2)
+  print('Wrote timing report to {}.'.format(fname))
+
+
+def print_report():
+  for (name, stage_items) in report()['stages'].items():
+    items = ', '.join('{} {}'.format(value, item_name)
+                      for (item_name, value) in stage_items.items()
+                      if item_name not in ('seconds', 'calls'))
+    print('{:<16}{:>10.3f}s in {:>5} calls  {}'.format(
+        name, stage_items.get('seconds', 0.0), stage_items.get('calls', 0),
+        items))
@@ -4,6 +4,7 @@ import numpy as np
 
 from typing import List, Tuple
 
+import instrumentation
 import util
 import classes.experiment_video as experiment_video
 import classes.participant as participant
@@ -14,6 +15,7 @@ experiment_data_dir = '../data/experiment1/'
 VIDEOS = range(1, 15)
 DETECTION_THRESHOLD = 60.0
 
+@instrumentation.timed('load_eyetrack')
 def load_eyetrack(participantID : int) -> np.ndarray:
   fname = experiment_data_dir + str(participantID).zfill(2) + '_eyetracking.csv'
   with open(fname, 'r') as f:
@@ -28,6 +30,7 @@ def load_eyetrack(participantID : int) -> np.ndarray:
       eyetrack.append([timestamp, gaze_x, gaze_y, diam])
   print('Loading {} rows of eyetracking data from {}.'.format(len(eyetrack),
                                                               fname))
+  instrumentation.count('load_eyetrack', samples=len(eyetrack))
   return np.array(eyetrack)
 
 def get_best(left: float, right: float):
@@ -43,6 +46,7 @@ def get_best(left: float, right: float):
     return left
   return (left + right)/2
 
+@instrumentation.timed('load_stimulus')
 def load_stimulus(participantID: int) -> List[experiment_frame.ExperimentFrame]:
   fname = experiment_data_dir + str(participantID).zfill(2) + '_stimulus.csv'
   with open(fname, 'r') as f:
@@ -83,8 +87,10 @@ def load_stimulus(participantID: int) -> List[experiment_frame.ExperimentFrame]:
       frames.append(experiment_frame.ExperimentFrame(
           video_idx, t, video_frame, target, object_detection_threshold))
       video_frame += 1
+  instrumentation.count('load_stimulus', frames=len(frames))
   return frames
 
+@instrumentation.timed('synchronize')
 def synchronize_eyetracking_with_stimulus(eyetrack, frames):
   """Interpolates eyetracking frames to same timepoints as stimulus frames."""
   eyetrack_idx = 0
@@ -106,7 +112,9 @@ def synchronize_eyetracking_with_stimulus(eyetrack, frames):
     gaze_x, gaze_y, diam = ((1 - theta) * eyetrack[eyetrack_idx - 1, 1:]
                           +   theta   * eyetrack[eyetrack_idx, 1:])
     frame.set_eyetrack(gaze_x, gaze_y, diam)
+  instrumentation.count('synchronize', frames=len(frames))
 
+@instrumentation.timed('load_participant')
 def load_participant(participantID: int) -> participant.Participant:
 
   eyetrack = load_eyetrack(participantID)
@@ -1,26 +1,149 @@
-"""This module gives metrics for comparing model performance to ground truth."""
+"""This module gives metrics for comparing model performance to ground truth.
 
-from typing import List, Tuple
+Metrics are computed over integer-coded label sequences (see encode_objects),
+so that each is a single vectorized pass over a video's frames.
+"""
+
+from collections import namedtuple
+from typing import List, Optional, Sequence, Tuple
 
 import math
 import numpy as np
 
+from classes.object_frame import ObjectFrame
+
 # Allow participant 18 frames (300ms) to find new target after switch
 GRACE_PERIOD = 18
 
+# Integer code of a missing object (e.g., when the HMM has no estimate)
+NO_OBJECT = -1
+
+LabelMetrics = namedtuple('LabelMetrics', [
+    # Proportion of scored frames in which the prediction matches the target
+    'accuracy',
+    # Dict mapping each target class name to accuracy on frames of that class
+    'per_class_accuracy',
+    # Frames from each target switch until the prediction first matches the
+    # new target (switches after which it never does are omitted)
+    'switch_latencies',
+    # Dict counting scored frames that are 'correct', or incorrect with a
+    # prediction of the 'same_class' or a 'different_class' as the target,
+    # and unscored frames outside the grace period with 'no_prediction'
+    'confusion',
+])
+
+
+def encode_objects(objects: Sequence[Optional[ObjectFrame]]) -> np.ndarray:
+  """Returns the object_id of each object, or NO_OBJECT where it is None."""
+  return np.fromiter((NO_OBJECT if obj is None else obj.object_id
+                      for obj in objects), dtype=np.int64, count=len(objects))
+
+
+def encode_classes(objects: Sequence[Optional[ObjectFrame]]) -> np.ndarray:
+  """Returns the class name of each object, or '' where it is None."""
+  return np.array(['' if obj is None else obj.class_name for obj in objects])
+
+
+def switch_indices(actual_ids: np.ndarray) -> np.ndarray:
+  """Returns the indices of frames in which the target changes (including the
+  first frame, unless it has no target)."""
+  previous_ids = np.concatenate(([NO_OBJECT], actual_ids[:-1]))
+  return np.flatnonzero(actual_ids != previous_ids)
+
+
+def grace_period_mask(actual_ids: np.ndarray,
+                      grace_period: int = GRACE_PERIOD) -> np.ndarray:
+  """Returns whether each frame is more than grace_period frames after the
+  most recent target switch."""
+  is_switch = np.zeros(len(actual_ids), dtype=bool)
+  is_switch[switch_indices(actual_ids)] = True
+  frame_idx = np.arange(len(actual_ids))
+  last_switch_idx = np.maximum.accumulate(np.where(is_switch, frame_idx, 0))
+  return frame_idx > last_switch_idx + grace_period
+
+
+def compute_metrics(predicted_ids: np.ndarray, actual_ids: np.ndarray,
+                    actual_classes: Optional[np.ndarray] = None,
+                    predicted_classes: Optional[np.ndarray] = None,
+                    grace_period: int = GRACE_PERIOD) -> LabelMetrics:
+  """Computes all metrics from integer-coded predicted and actual sequences.
+
+  Frames within the grace period after a target switch, and frames with no
+  prediction, are not scored.
+
+  Args:
+    predicted_ids: predicted object in each frame, as coded by encode_objects
+    actual_ids: target object in each frame, as coded by encode_objects
+    actual_classes: class name of the target in each frame, as given by
+      encode_classes; if omitted, per-class accuracy is not computed
+    predicted_classes: class name of the predicted object in each frame, as
+      given by encode_classes; if this or actual_classes is omitted, all
+      incorrect predictions are counted as of a different_class
+    grace_period: number of frames after each switch not to score
+  """
+  num_frames = min(len(predicted_ids), len(actual_ids))
+  predicted_ids = predicted_ids[:num_frames]
+  actual_ids = actual_ids[:num_frames]
+  is_correct = predicted_ids == actual_ids
+  outside_grace_period = grace_period_mask(actual_ids, grace_period)
+  is_scored = outside_grace_period & (predicted_ids != NO_OBJECT)
+  accuracy = (is_correct[is_scored].mean() if is_scored.any()
+              else float('nan'))
+
+  # Latency of the first correct prediction within each target segment
+  switches = switch_indices(actual_ids)
+  segment_idx = np.searchsorted(switches, np.arange(num_frames),
+                                side='right') - 1
+  correct_frames = np.flatnonzero(is_correct & (segment_idx >= 0))
+  correct_segments, first_correct = np.unique(segment_idx[correct_frames],
+                                              return_index=True)
+  switch_latencies = (correct_frames[first_correct]
+                      - switches[correct_segments])
+
+  per_class_accuracy = {}
+  num_same_class = 0
+  if actual_classes is not None:
+    actual_classes = actual_classes[:num_frames]
+    class_names, class_idx = np.unique(actual_classes[is_scored],
+                                       return_inverse=True)
+    class_accuracies = (np.bincount(class_idx, weights=is_correct[is_scored],
+                                    minlength=len(class_names))
+                        / np.bincount(class_idx, minlength=len(class_names)))
+    per_class_accuracy = dict(zip(class_names.tolist(),
+                                  class_accuracies.tolist()))
+    if predicted_classes is not None:
+      # Wrong objects whose class matches the target's class
+      num_same_class = int(np.sum(
+          is_scored & ~is_correct
+          & (predicted_classes[:num_frames] == actual_classes)))
+
+  num_incorrect = int(np.sum(is_scored & ~is_correct))
+  confusion = {
+      'correct': int(np.sum(is_scored & is_correct)),
+      'same_class': num_same_class,
+      'different_class': num_incorrect - num_same_class,
+      'no_prediction': int(np.sum(outside_grace_period
+                                  & (predicted_ids == NO_OBJECT))),
+  }
+  return LabelMetrics(accuracy, per_class_accuracy, switch_latencies,
+                      confusion)
+
+
+def compute_object_metrics(predicted_seq: List[Optional[ObjectFrame]],
+                           actual_seq: List[ObjectFrame],
+                           grace_period: int = GRACE_PERIOD) -> LabelMetrics:
+  """Computes all metrics from predicted and actual object sequences."""
+  return compute_metrics(encode_objects(predicted_seq),
+                         encode_objects(actual_seq),
+                         encode_classes(actual_seq),
+                         encode_classes(predicted_seq), grace_period)
+
+
+def compute_accuracy(predicted_seq: List[ObjectFrame],
+                     actual_seq: List[ObjectFrame]) -> float:
+  return compute_metrics(encode_objects(predicted_seq),
+                         encode_objects(actual_seq)).accuracy
 
-def compute_accuracy(predicted_seq: List[int], actual_seq: List[int]) -> float:
-  predicted_correct = []
-  prev_actual = None
-  last_switch_idx = 0
-  for idx, (predicted, actual) in enumerate(zip(predicted_seq, actual_seq)):
-    if actual != prev_actual:
-      prev_actual = actual
-      last_switch_idx = idx
-    elif (idx > last_switch_idx + GRACE_PERIOD
-          and predicted != None):
-      predicted_correct.append(predicted == actual)
-  return np.mean(predicted_correct)
 
 def mean_and_ste(array: List[float]) -> Tuple[float, float]:
   return np.nanmean(array), np.nanstd(array)/math.sqrt(len(array))
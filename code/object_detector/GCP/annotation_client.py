@@ -0,0 +1,228 @@
+"""This module annotates many videos concurrently with an annotation endpoint.
+
+Each video is submitted on a thread pool with at most max_in_flight requests
+outstanding at once; requests failing with transient errors are retried with
+exponential backoff, and progress is printed as each video finishes. The
+annotations of video NN.mp4 are written (atomically) to
+NN_object_annotations.json in the output directory, and videos whose
+annotations already exist are skipped, so interrupted runs can be resumed.
+
+The endpoint is pluggable: GoogleVideoIntelligenceEndpoint calls the Google
+Cloud Video Intelligence API (as object_tracking_from_local_video.py does for
+one video), while HttpEndpoint uploads videos to an HTTP server, such as the
+local stand-in in fake_annotation_server.py.
+
+Example usage:
+  python annotation_client.py ../../../data/MOT17_videos/*.mp4 \
+      --endpoint http://localhost:8080 --max_in_flight 4
+"""
+
+import argparse
+import concurrent.futures
+import os
+import random
+import shutil
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional
+import urllib.error
+import urllib.request
+
+OUTPUT_DIR = '.'
+MAX_IN_FLIGHT = 4
+MAX_RETRIES = 3
+# Seconds to wait before the first retry, doubling for each further retry
+INITIAL_BACKOFF = 1.0
+# Seconds to wait for the annotation of a single video
+REQUEST_TIMEOUT = 300
+
+_COPY_CHUNK_SIZE = 2**20
+# HTTP status codes of errors that may succeed if retried
+_TRANSIENT_HTTP_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class TransientAnnotationError(Exception):
+  """Raised by endpoints for failures that may succeed if retried."""
+
+
+class GoogleVideoIntelligenceEndpoint:
+  """Annotates videos with the Google Cloud Video Intelligence API.
+
+  Videos given as gs:// URIs are annotated in place; local videos are
+  uploaded, which the API requires to be read into memory.
+  """
+
+  def __init__(self, timeout: float = REQUEST_TIMEOUT):
+    # Imported here, so that other endpoints work without the Google libraries
+    from google.api_core import exceptions
+    from google.cloud import videointelligence
+    from google.protobuf.json_format import MessageToJson
+    self._client = videointelligence.VideoIntelligenceServiceClient()
+    self._features = [videointelligence.enums.Feature.OBJECT_TRACKING]
+    self._message_to_json = MessageToJson
+    self._transient_errors = (exceptions.ServiceUnavailable,
+                              exceptions.TooManyRequests,
+                              exceptions.InternalServerError,
+                              exceptions.DeadlineExceeded,
+                              concurrent.futures.TimeoutError)
+    self._timeout = timeout
+
+  def annotate(self, video_path: str, out_file: BinaryIO):
+    try:
+      if video_path.startswith('gs://'):
+        operation = self._client.annotate_video(input_uri=video_path,
+                                                features=self._features)
+      else:
+        with open(video_path, 'rb') as in_file:
+          operation = self._client.annotate_video(input_content=in_file.read(),
+                                                  features=self._features)
+      result = operation.result(timeout=self._timeout)
+    except self._transient_errors as e:
+      raise TransientAnnotationError(e) from e
+    out_file.write(self._message_to_json(result).encode())
+
+
+class HttpEndpoint:
+  """Annotates videos by uploading them to an HTTP annotation server.
+
+  Each video is POSTed to <url>/annotate/<video filename>, and the response
+  body is the annotation JSON. Both are streamed, rather than held in memory.
+  """
+
+  def __init__(self, url: str, timeout: float = REQUEST_TIMEOUT):
+    self._url = url.rstrip('/')
+    self._timeout = timeout
+
+  def annotate(self, video_path: str, out_file: BinaryIO):
+    with open(video_path, 'rb') as in_file:
+      request = urllib.request.Request(
+          '{}/annotate/{}'.format(self._url, os.path.basename(video_path)),
+          data=in_file, method='POST',
+          headers={'Content-Type': 'application/octet-stream',
+                   'Content-Length': str(os.path.getsize(video_path))})
+      try:
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+          shutil.copyfileobj(response, out_file, _COPY_CHUNK_SIZE)
+      except urllib.error.HTTPError as e:
+        if e.code in _TRANSIENT_HTTP_CODES:
+          raise TransientAnnotationError(e) from e
+        raise
+      except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+        raise TransientAnnotationError(e) from e
+
+
+def annotation_fname(video_path: str, output_dir: str = OUTPUT_DIR) -> str:
+  """Returns the file to which a video's annotations are written."""
+  video_name = os.path.splitext(os.path.basename(video_path))[0]
+  return os.path.join(output_dir, video_name + '_object_annotations.json')
+
+
+def _annotate_with_retries(endpoint, video_path: str, output_fname: str,
+                           max_retries: int, initial_backoff: float) -> int:
+  """Annotates one video, returning the number of attempts made."""
+  for attempt in range(max_retries + 1):
+    try:
+      # Write atomically, so that failed attempts never leave partial output
+      with open(output_fname + '.tmp', 'wb') as out_file:
+        endpoint.annotate(video_path, out_file)
+      os.replace(output_fname + '.tmp', output_fname)
+      return attempt + 1
+    except TransientAnnotationError:
+      if attempt == max_retries:
+        raise
+      # Jitter the backoff, so that concurrent retries do not synchronize
+      time.sleep(initial_backoff * 2**attempt * random.uniform(0.5, 1.5))
+    finally:
+      if os.path.exists(output_fname + '.tmp'):
+        os.remove(output_fname + '.tmp')
+
+
+def annotate_videos(video_paths: List[str], endpoint,
+                    output_dir: str = OUTPUT_DIR,
+                    max_in_flight: int = MAX_IN_FLIGHT,
+                    max_retries: int = MAX_RETRIES,
+                    initial_backoff: float = INITIAL_BACKOFF
+                    ) -> Dict[str, Optional[Exception]]:
+  """Annotates videos concurrently, writing each video's annotations to JSON.
+
+  Args:
+    video_paths: paths (or, for some endpoints, URIs) of videos to annotate
+    endpoint: object whose annotate(video_path, out_file) method writes the
+      annotation JSON of a video to a binary file, raising
+      TransientAnnotationError for failures that may succeed if retried
+    output_dir: directory in which to write annotations
+    max_in_flight: maximum number of concurrent requests
+    max_retries: maximum number of times to retry each video
+    initial_backoff: seconds to wait before the first retry of a video
+
+  Returns:
+    dict mapping each video path to None if it was annotated (or skipped), and
+    otherwise to the exception with which it finally failed
+  """
+  os.makedirs(output_dir, exist_ok=True)
+  results = {}
+  pending = []
+  for video_path in video_paths:
+    if os.path.exists(annotation_fname(video_path, output_dir)):
+      print('Skipping {}, which is already annotated.'.format(video_path))
+      results[video_path] = None
+    else:
+      pending.append(video_path)
+
+  num_done = 0
+  print_lock = threading.Lock()
+  start_time = time.perf_counter()
+  with concurrent.futures.ThreadPoolExecutor(max_in_flight) as executor:
+    futures = {
+        executor.submit(_annotate_with_retries, endpoint, video_path,
+                        annotation_fname(video_path, output_dir), max_retries,
+                        initial_backoff): video_path
+        for video_path in pending}
+    for future in concurrent.futures.as_completed(futures):
+      video_path = futures[future]
+      num_done += 1
+      try:
+        num_attempts = future.result()
+        results[video_path] = None
+        status = 'annotated after {} attempt(s)'.format(num_attempts)
+      except Exception as e:
+        results[video_path] = e
+        status = 'FAILED ({}: {})'.format(type(e).__name__, e)
+      with print_lock:
+        print('[{}/{}] {} {} ({:.1f}s elapsed)'.format(
+            num_done, len(pending), video_path, status,
+            time.perf_counter() - start_time))
+  return results
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('video_paths', nargs='+',
+                      help='Videos (or gs:// URIs) to annotate')
+  parser.add_argument('--endpoint', default='google',
+                      help='"google" for the Video Intelligence API, or the '
+                           'URL of an HTTP annotation server')
+  parser.add_argument('--output_dir', default=OUTPUT_DIR,
+                      help='Directory in which to write annotations')
+  parser.add_argument('--max_in_flight', type=int, default=MAX_IN_FLIGHT,
+                      help='Maximum number of concurrent requests')
+  parser.add_argument('--max_retries', type=int, default=MAX_RETRIES,
+                      help='Maximum number of retries per video')
+  args = parser.parse_args()
+
+  if args.endpoint == 'google':
+    endpoint = GoogleVideoIntelligenceEndpoint()
+  else:
+    endpoint = HttpEndpoint(args.endpoint)
+  results = annotate_videos(args.video_paths, endpoint, args.output_dir,
+                            args.max_in_flight, args.max_retries)
+  failed = [path for (path, error) in results.items() if error is not None]
+  print('Annotated {} of {} videos.'.format(len(results) - len(failed),
+                                            len(results)))
+  if failed:
+    print('Failed videos: {}'.format(' '.join(failed)))
+    raise SystemExit(1)
+
+
+if __name__ == '__main__':
+  main()
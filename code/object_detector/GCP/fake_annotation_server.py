@@ -0,0 +1,137 @@
+"""This module implements a local stand-in for the video annotation service.
+
+The FakeAnnotationServer accepts the same requests as annotation_client's
+HttpEndpoint (a POST of the video's content to /annotate/<video filename>)
+and replays canned annotation responses, e.g., those saved by earlier runs
+against the real service. It can inject latency and transient failures, to
+exercise the client's concurrency and retries without network access.
+
+A response for video NN.mp4 is read from NN_object_annotations.json in the
+canned response directory; other videos get 404 responses.
+
+Example usage:
+  python fake_annotation_server.py --port 8080 --failure_rate 0.2
+"""
+
+import argparse
+import http.server
+import os
+import random
+import threading
+import time
+
+CANNED_RESPONSE_DIR = os.path.dirname(os.path.abspath(__file__))
+_READ_CHUNK_SIZE = 2**20
+
+
+class FakeAnnotationServer:
+  """Serves canned annotation responses on a background thread.
+
+  Example usage:
+    with FakeAnnotationServer(canned_dir) as server:
+      endpoint = annotation_client.HttpEndpoint(server.url)
+      ...
+
+  Attributes:
+    url: base URL of the server
+    num_requests: number of annotation requests received
+  """
+
+  def __init__(self, canned_dir: str = CANNED_RESPONSE_DIR, port: int = 0,
+               latency: float = 0.0, failure_rate: float = 0.0,
+               seed: int = None):
+    """
+    Args:
+      canned_dir: directory of canned NN_object_annotations.json responses
+      port: port on which to listen (0 for any free port)
+      latency: seconds to wait before responding to each request
+      failure_rate: probability of responding to a request with a 503 error
+      seed: optional seed for injecting failures
+    """
+    self.num_requests = 0
+    self._lock = threading.Lock()
+    self._rng = random.Random(seed)
+    server = self
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+      def do_POST(self):
+        # Consume the uploaded video in chunks, as the real service would
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining > 0:
+          remaining -= len(self.rfile.read(min(remaining, _READ_CHUNK_SIZE)))
+        with server._lock:
+          server.num_requests += 1
+          fail = server._rng.random() < failure_rate
+        time.sleep(latency)
+
+        video_fname = os.path.basename(self.path)
+        canned_fname = os.path.join(
+            canned_dir,
+            os.path.splitext(video_fname)[0] + '_object_annotations.json')
+        if not self.path.startswith('/annotate/'):
+          self.send_error(404, 'Unknown endpoint')
+        elif fail:
+          self.send_error(503, 'Injected transient failure')
+        elif not os.path.exists(canned_fname):
+          self.send_error(404, 'No canned response for ' + video_fname)
+        else:
+          with open(canned_fname, 'rb') as in_file:
+            response = in_file.read()
+          self.send_response(200)
+          self.send_header('Content-Type', 'application/json')
+          self.send_header('Content-Length', str(len(response)))
+          self.end_headers()
+          self.wfile.write(response)
+
+      def log_message(self, format, *args):
+        pass # Keep the client's progress output readable
+
+    self._server = http.server.ThreadingHTTPServer(('localhost', port), Handler)
+    self.url = 'http://localhost:{}'.format(self._server.server_address[1])
+    self._thread = threading.Thread(target=self._server.serve_forever,
+                                    daemon=True)
+
+  def start(self):
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc_info):
+    self.stop()
+    return False
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--canned_dir', default=CANNED_RESPONSE_DIR,
+                      help='Directory of canned annotation responses')
+  parser.add_argument('--port', type=int, default=8080,
+                      help='Port on which to listen')
+  parser.add_argument('--latency', type=float, default=0.0,
+                      help='Seconds to wait before each response')
+  parser.add_argument('--failure_rate', type=float, default=0.0,
+                      help='Probability of injecting a 503 error')
+  args = parser.parse_args()
+
+  server = FakeAnnotationServer(args.canned_dir, args.port, args.latency,
+                                args.failure_rate)
+  print('Serving canned annotations from {} at {}.'.format(args.canned_dir,
+                                                           server.url))
+  server.start()
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    server.stop()
+
+
+if __name__ == '__main__':
+  main()
@@ -1,26 +1,163 @@
 """This is the core object detector implementation."""
 
-from imageai.Detection import VideoObjectDetection
+import cv2
+import numpy as np
+import time
 
-def detect_objects(input_file_path, detection_confidence_threshold = 60):
+from imageai.Detection import ObjectDetection, VideoObjectDetection
+
+# Number of frames between progress reports
+_PROGRESS_INTERVAL = 100
+
+def detect_objects(input_file_path, detection_confidence_threshold = 60,
+                   output_file_path = 'labeled_video'):
   # detection_confidence_threshold (int between 1 and 99) is the minimum detector confidence needed to include an object
-  
+  # output_file_path is where the labeled video is written; this must differ
+  # between processes running the detector concurrently
+
   # Create object detector based on RetinaNet and load model weights
   detector = VideoObjectDetection()
   detector.setModelTypeAsRetinaNet()
   detector.setModelPath('resnet50_coco_best_v2.0.1.h5')
   detector.loadModel()
-  
+
   all_frames = []
+  start_time = time.time()
   # Generates a record of all objects detected
   def forFrame(frame_number, output_array, output_count):
     all_frames.append(output_array)
-    if frame_number % 100 == 0:
-      print(input_file_path + ' Frame ' + str(frame_number))
+    if frame_number % _PROGRESS_INTERVAL == 0:
+      frames_per_second = frame_number / (time.time() - start_time)
+      print('{} Frame {} ({:.2f} frames/s)'.format(input_file_path,
+                                                   frame_number,
+                                                   frames_per_second))
 
   detector.detectObjectsFromVideo(input_file_path = input_file_path,
-                                  output_file_path = 'labeled_video',
+                                  output_file_path = output_file_path,
                                   frames_per_second = 30,
                                   per_frame_function = forFrame,
                                   minimum_percentage_probability = detection_confidence_threshold)
   return all_frames
+
+def _propagate_objects(prev_gray, gray, frame_objects, max_points_per_object = 20):
+  """Moves each object's bounding box along the sparse optical flow inside it.
+
+  Args:
+    prev_gray: grayscale previous frame, in which frame_objects were detected
+    gray: grayscale current frame
+    frame_objects: list of objects (in detect_objects output format) in the
+      previous frame
+
+  Returns:
+    list of the same objects, with bounding boxes shifted by the median
+    displacement of features tracked within each box
+  """
+  height, width = gray.shape
+
+  # Gather trackable features from every box, to track them in a single call
+  points = []
+  point_owners = []
+  for (obj_idx, obj) in enumerate(frame_objects):
+    x1, y1, x2, y2 = (int(v) for v in obj['box_points'])
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(width, x2), min(height, y2)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+      continue
+    corners = cv2.goodFeaturesToTrack(prev_gray[y1:y2, x1:x2],
+                                      maxCorners=max_points_per_object,
+                                      qualityLevel=0.01, minDistance=3)
+    if corners is None:
+      continue
+    points.append(corners.reshape(-1, 2) + (x1, y1))
+    point_owners.append(np.full(len(corners), obj_idx))
+
+  displacements = {}
+  if points:
+    points = np.concatenate(points).astype(np.float32)
+    point_owners = np.concatenate(point_owners)
+    new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray,
+                                                     points.reshape(-1, 1, 2),
+                                                     None)
+    tracked = status.ravel() == 1
+    flow = new_points.reshape(-1, 2) - points
+    for obj_idx in np.unique(point_owners[tracked]):
+      displacements[obj_idx] = np.median(
+          flow[tracked & (point_owners == obj_idx)], axis=0)
+
+  propagated_objects = []
+  for (obj_idx, obj) in enumerate(frame_objects):
+    # Objects without trackable features keep their previous position
+    dx, dy = displacements.get(obj_idx, (0.0, 0.0))
+    box = obj['box_points'] + np.array([dx, dy, dx, dy])
+    propagated_objects.append({
+        'name': obj['name'],
+        'percentage_probability': obj['percentage_probability'],
+        'box_points': np.rint(box).astype(int)})
+  return propagated_objects
+
+def detect_objects_at_keyframes(input_file_path,
+                                detection_confidence_threshold = 60,
+                                keyframe_interval = 5):
+  """Like detect_objects, but only runs the detector every keyframe_interval
+  frames. Objects in the frames in between are propagated from the previous
+  frame using sparse (Lucas-Kanade) optical flow, and re-anchored to fresh
+  detections at the next keyframe. The output has the same format as
+  detect_objects.
+  """
+  detector = ObjectDetection()
+  detector.setModelTypeAsRetinaNet()
+  detector.setModelPath('resnet50_coco_best_v2.0.1.h5')
+  detector.loadModel()
+
+  video = cv2.VideoCapture(input_file_path)
+  all_frames = []
+  detection_time = propagation_time = 0.0
+  num_keyframes = 0
+  start_time = time.time()
+  prev_gray = None
+  frame_exists, frame = video.read()
+  while frame_exists:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    frame_number = len(all_frames)
+    if frame_number % keyframe_interval == 0:
+      stage_start_time = time.time()
+      _, frame_objects = detector.detectObjectsFromImage(
+          input_image=frame, input_type='array', output_type='array',
+          minimum_percentage_probability=detection_confidence_threshold)
+      detection_time += time.time() - stage_start_time
+      num_keyframes += 1
+    else:
+      stage_start_time = time.time()
+      frame_objects = _propagate_objects(prev_gray, gray, all_frames[-1])
+      propagation_time += time.time() - stage_start_time
+    all_frames.append(frame_objects)
+    prev_gray = gray
+
+    if (frame_number + 1) % _PROGRESS_INTERVAL == 0:
+      frames_per_second = (frame_number + 1) / (time.time() - start_time)
+      print('{} Frame {} ({:.2f} frames/s)'.format(input_file_path,
+                                                   frame_number + 1,
+                                                   frames_per_second))
+    frame_exists, frame = video.read()
+  video.release()
+
+  # Estimate the time that running the detector on every frame would take
+  full_detection_time = detection_time / max(1, num_keyframes) * len(all_frames)
+  print('{}: detected objects on {} of {} frames in {:.1f}s, propagated in '
+        '{:.1f}s; saved {:.1f}s of an estimated {:.1f}s full detection.'
+        .format(input_file_path, num_keyframes, len(all_frames),
+                detection_time, propagation_time,
+                full_detection_time - detection_time - propagation_time,
+                full_detection_time))
+  return all_frames
+
+def filter_by_confidence(all_frames, detection_confidence_threshold):
+  """Keeps only detections with at least the given confidence.
+
+  Since the detector records the confidence ('percentage_probability') of
+  every detection, running detect_objects once at a low threshold and then
+  filtering gives the same output as re-running it at each higher threshold.
+  """
+  return [[obj for obj in frame
+           if obj['percentage_probability'] >= detection_confidence_threshold]
+          for frame in all_frames]
@@ -1,33 +1,109 @@
-"""This module precomputes and saves the object detections for each video."""
+"""This module precomputes and saves the object detections for each video.
 
+Videos are processed independently, optionally in parallel across a pool of
+worker processes. Each video's output files double as its checkpoint: they are
+written atomically, and videos whose outputs all exist are skipped, so an
+interrupted run can simply be restarted.
+
+With --keyframe_interval k > 1, the detector only runs on every k-th frame,
+and objects are propagated to the frames in between using optical flow.
+
+Example usage:
+  python PreDetectObjects.py --num_workers 8
+  python PreDetectObjects.py --keyframe_interval 5 \\
+      --output_dir ../../data/detected_objects/keyframe5
+"""
+
+import argparse
+import functools
+import multiprocessing
 import os
 import pickle
 
-from ObjectDetector import detect_objects
+from ObjectDetector import (detect_objects, detect_objects_at_keyframes,
+                            filter_by_confidence)
 
 data_dir_in = '../../data/MOT17_videos'
 data_dir_out = '../../data/detected_objects'
 
 num_videos = 14
 detection_confidence_thresholds = [40, 60, 80]
-for video_idx in range(1, num_videos + 1):
+
+def _output_path(video_idx, confidence_threshold, output_dir):
+  return '{dir}/video{video_idx}_threshold{conf}.pickle'.format(
+      dir=output_dir, video_idx=str(video_idx).zfill(2),
+      conf=confidence_threshold)
+
+def _is_complete(video_idx, output_dir):
+  return all(os.path.exists(_output_path(video_idx, confidence_threshold,
+                                         output_dir))
+             for confidence_threshold in detection_confidence_thresholds)
+
+def process_video(video_idx, keyframe_interval = 1, output_dir = data_dir_out):
+  """Detects objects in a single video and saves them at each threshold."""
+  if _is_complete(video_idx, output_dir):
+    print('Skipping video {}; outputs already exist.'.format(video_idx))
+    return
 
   input_file_path = \
     '{dir}/{video_idx}.mp4'.format(dir=data_dir_in,
                                    video_idx=str(video_idx).zfill(2))
 
   print('Processing video ' + input_file_path + '...')
+
+  # This line runs the object detector, once, at the lowest threshold; outputs
+  # at higher thresholds are obtained by filtering on detection confidence
+  if keyframe_interval > 1:
+    all_detected_objects = detect_objects_at_keyframes(
+        input_file_path, min(detection_confidence_thresholds),
+        keyframe_interval)
+  else:
+    all_detected_objects = detect_objects(
+        input_file_path, min(detection_confidence_thresholds),
+        output_file_path='labeled_video_{}'.format(str(video_idx).zfill(2)))
+
   for confidence_threshold in detection_confidence_thresholds:
     print('at confidence threshold ' + str(confidence_threshold) + '...')
+    detected_objects = filter_by_confidence(all_detected_objects,
+                                            confidence_threshold)
 
-    # This line runs the object detector
-    detected_objects = detect_objects(input_file_path, confidence_threshold)
-
-    # Save results in pickle file
-    output_path = \
-      '{dir}/video{video_idx}_threshold{conf}.pickle'.format(dir=data_dir_out,
-              video_idx=str(video_idx).zfill(2),
-              conf=confidence_threshold)
-    with open(output_path, 'wb') as out_file:
+    # Save results in pickle file. Write to a temporary file first, so that a
+    # partially written file is never mistaken for a completed output.
+    output_path = _output_path(video_idx, confidence_threshold, output_dir)
+    with open(output_path + '.tmp', 'wb') as out_file:
       pickle.dump(detected_objects, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(output_path + '.tmp', output_path)
     print('Output results to ' + output_path)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--num_workers', type=int, default=1,
+                      help='Number of videos to process in parallel '
+                           '(default: 1; 0 uses every core)')
+  parser.add_argument('--keyframe_interval', type=int, default=1,
+                      help='Run the detector only every this many frames, '
+                           'propagating objects in between (default: 1)')
+  parser.add_argument('--output_dir', default=data_dir_out,
+                      help='Directory in which to save detections')
+  args = parser.parse_args()
+
+  os.makedirs(args.output_dir, exist_ok=True)
+  video_indices = [video_idx for video_idx in range(1, num_videos + 1)
+                   if not _is_complete(video_idx, args.output_dir)]
+  print('{} of {} videos left to process.'.format(len(video_indices),
+                                                  num_videos))
+
+  process = functools.partial(process_video,
+                              keyframe_interval=args.keyframe_interval,
+                              output_dir=args.output_dir)
+  num_workers = args.num_workers or os.cpu_count()
+  if num_workers == 1:
+    for video_idx in video_indices:
+      process(video_idx)
+  else:
+    # Use a fresh process per video, so each releases its model when done
+    with multiprocessing.Pool(num_workers, maxtasksperchild=1) as pool:
+      pool.map(process, video_indices, chunksize=1)
+
+if __name__ == '__main__':
+  main()
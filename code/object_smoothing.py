@@ -89,8 +89,49 @@ def _interpolate_missing_frames(target_list):
 
   return target_list
 
-def _sample_targets(tracker_list, object_durations, min_duration = 30,
-                    mean_duration = 45):
+def _compute_presence_index(tracker_list):
+  """Computes presence_index, a dict mapping from object ID strings to sorted
+     arrays of the frame indices in which that object appears
+  """
+  presence_index = {}
+  for (frame_idx, frame_list) in enumerate(tracker_list):
+    for obj in frame_list:
+      presence_index.setdefault(obj[0], []).append(frame_idx)
+  return {obj_ID : np.array(frames, dtype=int)
+          for (obj_ID, frames) in presence_index.items()}
+
+def _sample_switch_frame(presence_frames, frame_idx, last_frame, rng,
+                         min_duration, mean_duration):
+  """Samples the frame on which to switch away from the current target.
+
+  Candidate switch frames are drawn as
+    frame_idx + min_duration + int(Exponential(mean_duration)),
+  capped at last_frame, and redrawn (keeping the running minimum) until the
+  candidate is a frame in which the target is present. Rather than simulate
+  this rejection loop, we sample its outcome directly: a frame x below the cap
+  is reached by the running minimum independently with probability
+  P(D = x)/P(D <= x), so we scan the target's present frames downwards from
+  last_frame and stop at the first one that is reached. If none are reached,
+  the switch happens immediately, as in the original rejection loop.
+  """
+  q = np.exp(-1/mean_duration)
+  earliest_frame = frame_idx + min_duration
+  if last_frame < earliest_frame or rng.random() < q**(last_frame - earliest_frame):
+    # The first candidate is at least last_frame, which is always present
+    return last_frame
+
+  # Present frames in [earliest_frame, last_frame), latest first
+  lo, hi = np.searchsorted(presence_frames, [earliest_frame, last_frame])
+  candidates = presence_frames[lo:hi][::-1]
+  k = candidates - earliest_frame
+  hazards = (1 - q) * q**k / (1 - q**(k + 1))
+  reached = np.flatnonzero(rng.random(len(candidates)) < hazards)
+  if len(reached) == 0:
+    return frame_idx
+  return candidates[reached[0]]
+
+def _sample_targets(tracker_list, object_durations, presence_index, rng,
+                    min_duration = 30, mean_duration = 45):
   target_list = []
   next_switch_frame = -1
   for (frame_idx, frame_objects) in enumerate(tracker_list):
@@ -104,25 +145,12 @@ def _sample_targets(tracker_list, object_durations, min_duration = 30,
         target_list.append(None)
         continue
       weights = weights / weights.sum()
-      current_target_idx = np.random.choice(range(len(weights)), p = weights)
+      current_target_idx = rng.choice(len(weights), p = weights)
       current_target = tracker_list[frame_idx][current_target_idx][0]
-      next_switch_frame = object_durations[current_target][1]
-      next_switch_frame = min(next_switch_frame,
-                              (frame_idx + min_duration
-                               + int(np.random.exponential(mean_duration))))
-      attempt = 0
-      while current_target not in [obj[0] for obj in tracker_list[next_switch_frame]]:
-        attempt += 1
-        # if attempt % 100 == 0:
-        #   print(attempt)
-        if attempt > 1000:
-          # For some objects/frames, we may not be able to find a valid
-          # next_swith_frame even after many attempts. In this case, simply
-          # switch on the very next frame.
-          next_switch_frame = frame_idx
-          break
-        next_switch_frame = min(next_switch_frame,
-                                frame_idx + min_duration + int(np.random.exponential(mean_duration)))
+      next_switch_frame = _sample_switch_frame(
+          presence_index[current_target], frame_idx,
+          object_durations[current_target][1], rng, min_duration,
+          mean_duration)
 
     # However, we need to check that we only switch on non-missing frames
     found_target = False
@@ -135,7 +163,16 @@ def _sample_targets(tracker_list, object_durations, min_duration = 30,
 
   return _interpolate_missing_frames(target_list)
 
-def generate_target_list(all_frames):
+def generate_target_list(all_frames, seed = None):
+  """Smooths detected objects over time and samples a sequence of targets.
+
+  Args:
+    all_frames: list (over frames) of objects detected in each frame
+    seed: optional seed for the random number generator, so that target
+      sequences can be reproduced
+  """
   tracker_list = _smooth_objects(all_frames)
   object_durations = _compute_durations(tracker_list)
-  return _sample_targets(tracker_list, object_durations)
+  presence_index = _compute_presence_index(tracker_list)
+  rng = np.random.default_rng(seed)
+  return _sample_targets(tracker_list, object_durations, presence_index, rng)
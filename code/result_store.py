@@ -0,0 +1,157 @@
+"""This module implements a persistent store of HMM decoding results.
+
+Each (participant, video) decode is stored under a hash of everything it
+depends on: the participant's synchronized gaze and targets in the video, the
+tracked detected objects, the HMM hyperparameters and the grace period used
+for scoring. Rerunning an analysis after, e.g., adding a participant or
+changing one video's detections therefore only decodes the cells whose inputs
+changed, and reuses every other stored result.
+
+Example usage:
+  store = ResultStore()
+  detections_digest = hash_detections(video_objects)
+  result, was_cached = store.decode_and_score(
+      sigma, tau, experiment_video, video_objects, detections_digest)
+"""
+
+from collections import namedtuple
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from classes.experiment_video import ExperimentVideo
+from classes.object_frame import ObjectFrame
+import hmm
+import instrumentation
+import metrics
+
+RESULT_STORE_DIR = '../data/results/'
+
+# Increment whenever decoding or scoring changes, to invalidate stored results
+RESULT_VERSION = 2
+
+DecodeResult = namedtuple('DecodeResult', [
+    # Maximum likelihood object sequence, as output by hmm.forwards_backwards
+    'mle',
+    # metrics.LabelMetrics of the decode against the targets
+    'metrics',
+])
+
+
+def _hash_objects(hasher, objects: List[Optional[ObjectFrame]]):
+  # Hash (class_name, object_index), since object_ids vary across processes
+  hasher.update('\n'.join('' if obj is None
+                          else '{} {}'.format(obj.class_name, obj.object_index)
+                          for obj in objects).encode())
+  hasher.update(np.array([(obj.centroid + obj.size) if obj is not None
+                          else (-1, -1, -1, -1) for obj in objects],
+                         dtype=np.float64).tobytes())
+
+
+def hash_detections(video_objects: List[List[ObjectFrame]]) -> str:
+  """Returns a digest of the tracked objects in each frame of a video."""
+  hasher = hashlib.sha256()
+  hasher.update(np.array([len(frame) for frame in video_objects],
+                         dtype=np.int64).tobytes())
+  _hash_objects(hasher, [obj for frame in video_objects for obj in frame])
+  return hasher.hexdigest()
+
+
+def hash_experiment_video(experiment_video: ExperimentVideo) -> str:
+  """Returns a digest of the synchronized gaze and targets of a video."""
+  hasher = hashlib.sha256()
+  hasher.update(np.array([frame.gaze for frame in experiment_video.frames],
+                         dtype=np.float64).tobytes())
+  _hash_objects(hasher, [frame.target for frame in experiment_video.frames])
+  return hasher.hexdigest()
+
+
+def result_key(video_digest: str, detections_digest: str, sigma: float,
+               tau: float, grace_period: int = metrics.GRACE_PERIOD) -> str:
+  """Returns the key under which a decode is stored."""
+  hasher = hashlib.sha256()
+  hasher.update(repr((RESULT_VERSION, video_digest, detections_digest,
+                      float(sigma), float(tau), grace_period)).encode())
+  return hasher.hexdigest()
+
+
+class ResultStore:
+  """A directory of decoding results, each saved as a pickle named by key.
+
+  Attributes:
+    num_hits: number of results reused from the store
+    num_misses: number of results that had to be computed
+  """
+
+  def __init__(self, store_dir: str = RESULT_STORE_DIR):
+    self._store_dir = store_dir
+    os.makedirs(store_dir, exist_ok=True)
+    self.num_hits = 0
+    self.num_misses = 0
+
+  def _fname(self, key: str) -> str:
+    return os.path.join(self._store_dir, key + '.pickle')
+
+  def get(self, key: str) -> Optional[DecodeResult]:
+    try:
+      with open(self._fname(key), 'rb') as in_file:
+        return pickle.load(in_file)
+    except FileNotFoundError:
+      return None
+
+  def put(self, key: str, result: DecodeResult):
+    # Write atomically, so that interrupted runs never leave partial results.
+    # Each writer uses its own temporary file, since concurrent processes
+    # (e.g., shards of experiment1_sharded.py) may store the same key.
+    with tempfile.NamedTemporaryFile(dir=self._store_dir, suffix='.tmp',
+                                     delete=False) as out_file:
+      try:
+        pickle.dump(result, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+      except BaseException:
+        out_file.close()
+        os.remove(out_file.name)
+        raise
+    os.replace(out_file.name, self._fname(key))
+
+  def decode_and_score(self, sigma: float, tau: float,
+                       experiment_video: ExperimentVideo,
+                       video_objects: List[List[ObjectFrame]],
+                       detections_digest: Optional[str] = None,
+                       grace_period: int = metrics.GRACE_PERIOD
+                       ) -> Tuple[DecodeResult, bool]:
+    """Decodes and scores a video, unless an identical decode is stored.
+
+    Args:
+      sigma: Scaling factor of HMM emission distribution
+      tau: Nominal probability that the participant stays on the same object
+      experiment_video: participant data for the video
+      video_objects: tracked objects in each frame of the video
+      detections_digest: hash_detections(video_objects), which can be passed
+        to avoid rehashing the same detections for each participant
+      grace_period: number of frames after each target switch not to score
+
+    Returns:
+      (result, whether the result was reused from the store)
+    """
+    if detections_digest is None:
+      detections_digest = hash_detections(video_objects)
+    key = result_key(hash_experiment_video(experiment_video),
+                     detections_digest, sigma, tau, grace_period)
+    result = self.get(key)
+    if result is not None:
+      self.num_hits += 1
+      return result, True
+
+    self.num_misses += 1
+    mle = hmm.forwards_backwards(sigma, tau, experiment_video, video_objects)
+    ground_truth = [frame.target for frame in experiment_video.frames]
+    with instrumentation.stage('score'):
+      video_metrics = metrics.compute_object_metrics(mle, ground_truth,
+                                                     grace_period)
+    result = DecodeResult(mle, video_metrics)
+    self.put(key, result)
+    return result, False
@@ -0,0 +1,69 @@
+"""This module implements per-frame spatial indices of detected objects.
+
+These let the HMM prune its candidate states in each frame to objects near the
+gaze. The emission density of an object is Gaussian, centered on the object's
+centroid, with standard deviations sigma times its half-width and half-height,
+so an object is a candidate if the gaze lies within k such standard deviations
+(in Mahalanobis distance) of its centroid. The index first finds objects whose
+centroids are within k * sigma times the largest half-size in the frame (with
+a cKDTree), and then checks each of these exactly.
+
+If no object is a candidate (e.g., the participant looks at the background),
+all objects in the frame are candidates, so that decoding never loses track.
+
+Pruning approximates exact decoding: an object more than k standard
+deviations from the gaze has log emission density at least k^2/2 below its
+peak, so it can only be the maximum likelihood state if its path is more
+than k^2/2 log-units more likely than those of all candidates.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.spatial
+
+from classes.object_frame import ObjectFrame
+
+# Default number of emission standard deviations within which to keep objects
+PRUNING_K = 4
+
+
+class FrameIndex:
+  """Spatial index of the objects detected in a single frame."""
+
+  def __init__(self, objects_in_frame: List[ObjectFrame]):
+    self.objects = objects_in_frame
+    self._centroids = np.array([obj.centroid for obj in objects_in_frame],
+                               dtype=float).reshape(-1, 2)
+    self._sizes = np.array([obj.size for obj in objects_in_frame],
+                           dtype=float).reshape(-1, 2)
+    self._max_size = self._sizes.max() if len(objects_in_frame) > 0 else 0.0
+    self._tree = (scipy.spatial.cKDTree(self._centroids)
+                  if len(objects_in_frame) > 0 else None)
+
+  def candidates(self, gaze: Tuple[float, float], sigma: float,
+                 k: float = PRUNING_K) -> List[ObjectFrame]:
+    """Returns the objects within k emission standard deviations of the gaze,
+    or all objects if there are none."""
+    if self._tree is None:
+      return self.objects
+    nearby_idx = self._tree.query_ball_point(gaze, k * sigma * self._max_size)
+    if nearby_idx:
+      nearby_idx = np.array(nearby_idx)
+      with np.errstate(divide='ignore', invalid='ignore'):
+        z = ((np.asarray(gaze) - self._centroids[nearby_idx])
+             / (sigma * self._sizes[nearby_idx]))
+      is_candidate = np.sum(z**2, axis=1) <= k**2
+      if is_candidate.any():
+        return [self.objects[i] for i in nearby_idx[is_candidate]]
+    return self.objects
+
+
+def build_video_index(
+    video_objects: List[List[ObjectFrame]]) -> List[FrameIndex]:
+  """Builds the spatial index of each frame of a video.
+
+  Since indices depend only on the detected objects, they can be built once
+  per video and reused for every participant.
+  """
+  return [FrameIndex(objects_in_frame) for objects_in_frame in video_objects]
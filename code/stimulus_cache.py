@@ -0,0 +1,176 @@
+"""This module pre-renders the stimulus frames shown by display_experiment.
+
+Decoding, rescaling and annotating video frames during a session risks timing
+errors in the recorded data. Instead, the fully composed screen frames of each
+(video, threshold) trial can be rendered ahead of time into an uncompressed
+.npy file, which display_experiment memory-maps, so that playback only pages
+frames in and presents them. Since targets are drawn when rendering, each
+participant needs their own cache, alongside which the target shown in each
+frame is saved, to be recorded during playback.
+
+Note that raw screen frames take about 6.9MB each, so a participant's full
+cache of 41 trials requires a large amount of fast disk.
+
+Example usage:
+  python stimulus_cache.py --participant_id 17
+"""
+
+import argparse
+import os
+import pickle
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+import object_smoothing
+import util
+from video_reader import Letterbox, PrefetchingVideoReader
+
+CACHE_DIR = '../data/stimulus_cache/'
+DETECTED_OBJECTS_DIR = '../data/detected_objects/multifidelity/'
+VIDEO_DIR = '../data/MOT17_videos/'
+SCREEN_WIDTH = 1920
+SCREEN_HEIGHT = 1200
+_TARGET_COLOR = (0, 255, 0) # bright green
+
+# A target record is (object_ID, target_conf, centroid_x, centroid_y,
+# horz_rad, vert_rad), as written to the stimulus CSV
+TargetRecord = Tuple[str, float, int, int, int, int]
+
+
+def draw_target(frame: np.ndarray, target, letterbox: Letterbox) -> TargetRecord:
+  """Draws an ellipse around a target on a screen frame.
+
+  Args:
+    frame: screen frame on which to draw
+    target: (object_ID, box_points, confidence) of the target, as output by
+      object_smoothing.generate_target_list
+    letterbox: Letterbox with which the video was rescaled to the screen
+
+  Returns:
+    target record of the drawn target
+  """
+  scale = letterbox.scale
+  object_ID, b, target_conf = target
+  centroid = util.calc_centroid(b)
+  centroid = (int(scale * centroid[0]) + letterbox.left_padding,
+              int(scale * centroid[1]) + letterbox.top_padding)
+  horz_rad = int(scale * (b[2] - b[0])/2)
+  vert_rad = int(scale * (b[3] - b[1])/2)
+  cv2.ellipse(frame, centroid, (horz_rad, vert_rad), 0, 0, 360,
+              color = _TARGET_COLOR, thickness = 2)
+  return (object_ID, target_conf, centroid[0], centroid[1], horz_rad,
+          vert_rad)
+
+
+def _trial_prefix(cache_dir: str, video_idx: int,
+                  confidence_threshold: int) -> str:
+  return os.path.join(cache_dir, 'video{}_threshold{}'.format(
+      str(video_idx).zfill(2), confidence_threshold))
+
+
+def prerender_trial(video_idx: int, confidence_threshold: int, cache_dir: str,
+                    seed: Optional[int] = None):
+  """Renders a trial's composed screen frames and targets into the cache.
+
+  Args:
+    video_idx: index (between 1-14, inclusive) of the stimulus video
+    confidence_threshold: object detector confidence threshold of the trial
+    cache_dir: directory in which to save the trial
+    seed: optional seed with which to sample targets
+  """
+  detected_objects_fname = 'video{}_threshold{}.pickle'.format(
+      str(video_idx).zfill(2), confidence_threshold)
+  with open(DETECTED_OBJECTS_DIR + detected_objects_fname, 'rb') as in_file:
+    all_frames = pickle.load(in_file)
+  target_list = object_smoothing.generate_target_list(all_frames, seed)
+
+  letterbox = Letterbox(util.VIDEO_SIZES[video_idx - 1],
+                        (SCREEN_HEIGHT, SCREEN_WIDTH))
+  video = PrefetchingVideoReader(VIDEO_DIR + str(video_idx).zfill(2) + '.mp4',
+                                 transform=letterbox)
+
+  prefix = _trial_prefix(cache_dir, video_idx, confidence_threshold)
+  frames = np.lib.format.open_memmap(
+      prefix + '_frames.npy.tmp', mode='w+', dtype=np.uint8,
+      shape=(len(target_list), SCREEN_HEIGHT, SCREEN_WIDTH, 3))
+
+  # As in display_experiment, each frame shows the target sampled for the
+  # previous frame, and the last drawn target is recorded until a new one is
+  targets = []
+  target_record = None
+  frame_exists, frame = video.read()
+  while frame_exists and len(targets) < len(target_list):
+    current_frame = len(targets)
+    if current_frame > 0 and target_list[current_frame - 1] is not None:
+      target_record = draw_target(frame, target_list[current_frame - 1],
+                                  letterbox)
+    frames[current_frame] = frame
+    targets.append(target_record)
+    frame_exists, frame = video.read()
+  fps = video.fps
+  video.release()
+  frames.flush()
+  del frames
+  os.replace(prefix + '_frames.npy.tmp', prefix + '_frames.npy')
+
+  with open(prefix + '_targets.pickle', 'wb') as out_file:
+    pickle.dump({'fps': fps, 'targets': targets}, out_file,
+                protocol=pickle.HIGHEST_PROTOCOL)
+  print('Pre-rendered {} frames to {}.'.format(len(targets), prefix))
+
+
+class CachedTrial:
+  """A pre-rendered trial, with frames memory-mapped from the cache.
+
+  Attributes:
+    frames: (num_frames X height X width X 3) memory-mapped screen frames
+    targets: target record (or None) shown in each frame
+    fps: natural frame rate of the video
+  """
+
+  def __init__(self, cache_dir: str, video_idx: int, confidence_threshold: int):
+    prefix = _trial_prefix(cache_dir, video_idx, confidence_threshold)
+    with open(prefix + '_targets.pickle', 'rb') as in_file:
+      metadata = pickle.load(in_file)
+    self.fps = metadata['fps']
+    self.targets = metadata['targets']
+    self.frames = np.load(prefix + '_frames.npy', mmap_mode='r')
+
+  @staticmethod
+  def exists(cache_dir: str, video_idx: int, confidence_threshold: int) -> bool:
+    prefix = _trial_prefix(cache_dir, video_idx, confidence_threshold)
+    return (os.path.exists(prefix + '_frames.npy')
+            and os.path.exists(prefix + '_targets.pickle'))
+
+  def __len__(self):
+    return len(self.targets)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--participant_id', required=True,
+                      help='ID of the participant for whom to render trials')
+  parser.add_argument('--seed', type=int, default=None,
+                      help='Seed with which to sample targets')
+  args = parser.parse_args()
+
+  cache_dir = os.path.join(CACHE_DIR, args.participant_id)
+  os.makedirs(cache_dir, exist_ok=True)
+  rng = np.random.default_rng(args.seed)
+  for video_idx in range(1, 15):
+    for confidence_threshold in [40, 60, 80]:
+      # Video 1 at conf 80 is skipped because no objects were detected
+      if video_idx == 1 and confidence_threshold == 80:
+        continue
+      # Draw every trial's seed, even for trials already cached, so that a
+      # resumed run renders the same targets as a fresh run
+      seed = int(rng.integers(2**32))
+      if CachedTrial.exists(cache_dir, video_idx, confidence_threshold):
+        continue
+      prerender_trial(video_idx, confidence_threshold, cache_dir, seed=seed)
+
+
+if __name__ == '__main__':
+  main()
@@ -5,9 +5,11 @@ import sys
 from typing import List, Tuple
 
 import centroidtracker
+import instrumentation
 from classes.object_frame import ObjectFrame
 
 
+@instrumentation.timed('impute')
 def impute_missing_data_D(X, max_len = 10):
   """Given a sequence X of D-dimensional vectors, performs __impute_missing_data
   (independently) on each dimension of X.
@@ -15,6 +17,7 @@ def impute_missing_data_D(X, max_len = 10):
   X is N X D, where D is the dimensionality and N is the sample length
   """
   D = X.shape[1]
+  instrumentation.count('impute', samples=X.shape[0])
   for d in range(D):
     X[:, d] = __impute_missing_data(X[:, d], max_len)
   return X
@@ -47,11 +50,14 @@ def __impute_missing_data(X, max_len):
 
 # Given a list (over frames) of objects detected by the object detector in each frame,
 # Stitches them together into object tracking data
+@instrumentation.timed('smooth')
 def smooth_objects(all_frames) -> List[List[ObjectFrame]]:
   tracker_list = [] 
   # Since we assume that objects cannot change types, we separately run the
   # object tracking algorithm for each object type
   obj_classes = [obj['name'] for frame in all_frames for obj in frame]
+  instrumentation.count('smooth', frames=len(all_frames),
+                        objects=len(obj_classes))
 
   # Initialize a centroid tracker for each object type
   trackers = {obj_type : centroidtracker.CentroidTracker(maxDisappeared = 15)
@@ -135,8 +141,14 @@ VIDEO_SIZES = [(1080, 1920),
                (1080, 1920),
                (1080, 1920),
                (1080, 1920)]
+# Native frame rate (in frames per second) of each MOT video.
+VIDEO_FRAME_RATES = [30, 30, 30, 30, 14, 14, 30, 30, 30, 30, 30, 30, 25, 25]
+# Number of frames in each MOT video.
+VIDEO_NUM_FRAMES = [450, 600, 1500, 1050, 837, 1194, 500, 625, 525, 654, 900, 900,
+                    750, 750]
 SCREEN_SIZE = (1200, 1920) # Resolution of stimulus display
 
+@instrumentation.timed('align')
 def align_objects_to_screen(
     video_idx: int,
     detected_objects: List[List[ObjectFrame]]):
@@ -166,6 +178,9 @@ def align_objects_to_screen(
   top_padding = max(0, int((screen_height - scaled_height)/2))
   left_padding = max(0, int((screen_width - scaled_width)/2))
 
+  if instrumentation.is_enabled():
+    instrumentation.count('align', frames=len(detected_objects),
+                          objects=sum(len(frame) for frame in detected_objects))
   for frame in detected_objects:
     for obj in frame:
       obj.centroid = (int(scale_factor * obj.centroid[0]) + left_padding,
@@ -0,0 +1,264 @@
+"""This module implements a video reader that decodes frames ahead of time.
+
+Decoding and rescaling a video frame can take a substantial fraction of the
+inter-frame delay, so doing it on the display thread causes late frames. The
+PrefetchingVideoReader instead decodes (and optionally preprocesses) frames on
+a background thread into a bounded queue, from which the display loop reads.
+
+The Letterbox transform rescales frames to fit the screen without allocating
+new arrays on the playback path.
+
+The CachedFrameReader instead serves frames in arbitrary order (e.g., when
+scrubbing back and forth through a video) from an LRU cache of decoded frames.
+"""
+
+import collections
+import queue
+import threading
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Default number of frames to decode ahead of time
+PREFETCH_QUEUE_SIZE = 16
+
+# Number of frames to decode at once when seeking backwards past the cache
+BACKWARD_BLOCK_SIZE = 15
+
+
+class Letterbox:
+  """Rescales video frames to fill the screen, centered with black borders.
+
+  Frames are resized directly into preallocated screen-sized canvases, which
+  are reused in round-robin order. A returned frame is therefore only valid
+  until num_buffers further frames have been transformed; when used with a
+  PrefetchingVideoReader, num_buffers must exceed its queue size by at least 2
+  (one frame being decoded and one being displayed).
+
+  Attributes:
+    scale: factor by which video frames are rescaled
+    scaled_size: (height, width) of the rescaled video within the screen
+    top_padding: height of the black border above the video
+    left_padding: width of the black border left of the video
+  """
+
+  def __init__(self, frame_size: Tuple[int, int],
+               screen_size: Tuple[int, int],
+               num_buffers: int = PREFETCH_QUEUE_SIZE + 2):
+    """
+    Args:
+      frame_size: (height, width) of the original video frames
+      screen_size: (height, width) of the screen
+      num_buffers: number of canvases to reuse
+    """
+    screen_height, screen_width = screen_size
+    video_height, video_width = frame_size
+    self.scale = min(screen_height/video_height, screen_width/video_width)
+    scaled_width = int(self.scale * video_width)
+    scaled_height = int(self.scale * video_height)
+    self.scaled_size = (scaled_height, scaled_width)
+    self.top_padding = max(0, int((screen_height - scaled_height)/2))
+    self.left_padding = max(0, int((screen_width - scaled_width)/2))
+
+    self._canvases = [np.zeros((screen_height, screen_width, 3), np.uint8)
+                      for _ in range(num_buffers)]
+    self._next_canvas = 0
+
+  def __call__(self, frame: np.ndarray) -> np.ndarray:
+    canvas = self._canvases[self._next_canvas]
+    self._next_canvas = (self._next_canvas + 1) % len(self._canvases)
+
+    top, left = self.top_padding, self.left_padding
+    bottom, right = (top + self.scaled_size[0], left + self.scaled_size[1])
+
+    # Annotations may have been drawn over the borders when this canvas was
+    # last used, so blank them before reuse
+    canvas[:top] = 0
+    canvas[bottom:] = 0
+    canvas[top:bottom, :left] = 0
+    canvas[top:bottom, right:] = 0
+    cv2.resize(frame, (self.scaled_size[1], self.scaled_size[0]),
+               dst=canvas[top:bottom, left:right])
+    return canvas
+
+
+class PrefetchingVideoReader:
+  """Decodes and preprocesses video frames on a background thread.
+
+  Example usage:
+    reader = PrefetchingVideoReader(video_fname, transform=rescale)
+    frame_exists, frame = reader.read()
+    while frame_exists:
+      ...
+      frame_exists, frame = reader.read()
+    reader.release()
+
+  Attributes:
+    fps: natural frame rate of the video
+    frame_size: (height, width) of the original video frames
+    num_stalls: number of reads that had to wait for a frame to be decoded
+  """
+
+  def __init__(self, video_fname: str,
+               transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+               max_queue_size: int = PREFETCH_QUEUE_SIZE,
+               start_frame: int = 0):
+    """
+    Args:
+      video_fname: path of the video to read
+      transform: function to apply to each decoded frame on the background
+        thread (e.g., rescaling to the screen)
+      max_queue_size: maximum number of frames to decode ahead of time
+      start_frame: index of the first frame to read
+    """
+    self._video = cv2.VideoCapture(video_fname)
+    if start_frame > 0:
+      self._video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    self.fps = self._video.get(cv2.CAP_PROP_FPS)
+    self.frame_size = (int(self._video.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                       int(self._video.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    self.num_stalls = 0
+
+    self._transform = transform
+    self._queue = queue.Queue(maxsize=max_queue_size)
+    self._stopped = threading.Event()
+    self._finished = False
+    self._thread = threading.Thread(target=self._decode_frames, daemon=True)
+    self._thread.start()
+
+  def _decode_frames(self):
+    frame_exists = True
+    while frame_exists and not self._stopped.is_set():
+      try:
+        frame_exists, frame = self._video.read()
+        if frame_exists and self._transform is not None:
+          frame = self._transform(frame)
+      except Exception as e:
+        # Hand the error to read(), instead of leaving it waiting forever
+        self._put(e)
+        return
+      self._put((frame_exists, frame))
+
+  def _put(self, item):
+    # Wait for space in the queue, unless the reader is released meanwhile
+    while not self._stopped.is_set():
+      try:
+        self._queue.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
+
+  def read(self):
+    """Returns the next (frame_exists, frame) pair, like cv2.VideoCapture.
+
+    Raises:
+      Exception: any error raised while decoding or transforming the frame on
+        the background thread
+    """
+    if self._finished:
+      return False, None
+    try:
+      item = self._queue.get_nowait()
+    except queue.Empty:
+      self.num_stalls += 1
+      item = self._queue.get()
+    if isinstance(item, Exception):
+      self._finished = True
+      raise item
+    frame_exists, frame = item
+    self._finished = not frame_exists
+    return frame_exists, frame
+
+  def release(self):
+    """Stops the background thread and releases the video."""
+    self._stopped.set()
+    self._thread.join()
+    self._video.release()
+
+
+class CachedFrameReader:
+  """Reads video frames in arbitrary order, with an LRU cache of frames.
+
+  Frames are decoded (and transformed) at most once while they remain in the
+  cache, whose total size is capped. Since seeking is much slower than
+  decoding the next frame, reading forwards decodes sequentially, and a cache
+  miss while moving backwards decodes a whole block of preceding frames.
+
+  Attributes:
+    fps: natural frame rate of the video
+    num_frames: number of frames in the video
+    num_hits: number of reads served from the cache
+    num_misses: number of reads that required decoding
+  """
+
+  def __init__(self, video_fname: str,
+               transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+               max_cache_bytes: int = 2**30,
+               backward_block_size: int = BACKWARD_BLOCK_SIZE):
+    """
+    Args:
+      video_fname: path of the video to read
+      transform: function to apply to each decoded frame before caching it
+      max_cache_bytes: maximum total size of cached frames
+      backward_block_size: number of frames to decode on a backwards miss
+    """
+    self._video = cv2.VideoCapture(video_fname)
+    self.fps = self._video.get(cv2.CAP_PROP_FPS)
+    self.num_frames = int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+    self.num_hits = 0
+    self.num_misses = 0
+
+    self._transform = transform
+    self._max_cache_bytes = max_cache_bytes
+    self._backward_block_size = backward_block_size
+    self._cache = collections.OrderedDict()
+    self._cache_bytes = 0
+    self._next_frame = 0 # Index of the frame that the video will decode next
+    self._last_read = -1
+
+  def _decode(self, frame_idx: int) -> Optional[np.ndarray]:
+    if frame_idx != self._next_frame:
+      self._video.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+    frame_exists, frame = self._video.read()
+    self._next_frame = frame_idx + 1
+    if not frame_exists:
+      return None
+    if self._transform is not None:
+      # Copy, since transforms may reuse their output buffers
+      frame = np.array(self._transform(frame))
+    self._insert(frame_idx, frame)
+    return frame
+
+  def _insert(self, frame_idx: int, frame: np.ndarray):
+    if frame_idx in self._cache:
+      return
+    self._cache[frame_idx] = frame
+    self._cache_bytes += frame.nbytes
+    while self._cache_bytes > self._max_cache_bytes and len(self._cache) > 1:
+      _, evicted_frame = self._cache.popitem(last=False)
+      self._cache_bytes -= evicted_frame.nbytes
+
+  def read(self, frame_idx: int) -> Optional[np.ndarray]:
+    """Returns a frame (which must not be modified), or None if it does not
+    exist."""
+    moving_backwards = frame_idx < self._last_read
+    self._last_read = frame_idx
+    if frame_idx in self._cache:
+      self.num_hits += 1
+      self._cache.move_to_end(frame_idx)
+      return self._cache[frame_idx]
+
+    self.num_misses += 1
+    first_frame = frame_idx
+    if moving_backwards:
+      # Decode the uncached block of frames ending with this one, in one pass
+      first_frame = max(0, frame_idx - self._backward_block_size + 1)
+      while first_frame in self._cache:
+        first_frame += 1
+    for block_frame_idx in range(first_frame, frame_idx + 1):
+      frame = self._decode(block_frame_idx)
+    return frame
+
+  def release(self):
+    self._video.release()
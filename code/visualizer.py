@@ -1,13 +1,18 @@
+import csv
 import cv2
 import math
+import os
 import numpy as np
 import pickle
 import time
 
+from gaze_heatmaps import HeatmapBlender
 import hmm
 import load_and_preprocess_data
+import metrics
 from classes.object_frame import ObjectFrame
 import util
+from video_reader import CachedFrameReader, Letterbox, PrefetchingVideoReader
 
 SIGMA = 1
 TAU = 0.9
@@ -17,55 +22,136 @@ DETECTED_OBJECTS_DIR = '../data/detected_objects/'
 SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1200
 
-# Allow participant 18 frames (300ms) to find new target after switch
-GRACE_PERIOD = 18
-
 SAVE_VIDEO_FILENAME = 'output.mp4'
+SAVE_VIDEO_CODEC = 'mp4v'
+SAVE_VIDEO_FILENAME_FORMAT = '{participant_idx:02d}_{video_idx:02d}.mp4'
+
+# Number of frames of context to render before and after each HMM error
+CLIP_PADDING = 30
 
-def _rescale_video_to_screen(frame: np.ndarray):
-  """Rescale video to fit the screen on which the experiment was displayed."""
-  video_height, video_width, _ = frame.shape
-  scale = min(SCREEN_HEIGHT/video_height, SCREEN_WIDTH/video_width)
-  scaled_width = int(scale * video_width)
-  scaled_height = int(scale * video_height)
-  frame = cv2.resize(frame, (scaled_width, scaled_height))
-
-  # Pad the remaining screen space with black space
-  top_padding = max(0, int((SCREEN_HEIGHT - scaled_height)/2))
-  left_padding = max(0, int((SCREEN_WIDTH - scaled_width)/2))
-  return cv2.copyMakeBorder(frame, top_padding,
-                            SCREEN_HEIGHT - (scaled_height + top_padding),
-                            left_padding,
-                            SCREEN_WIDTH - (scaled_width + left_padding),
-                            borderType=cv2.BORDER_CONSTANT, value=(0, 0, 0))
-
-def _plot_object(frame: np.ndarray, obj: ObjectFrame, color):
+# Maximum memory (in MB) of decoded frames to cache while scrubbing
+SCRUB_CACHE_MB = 1024
+
+def _plot_object(frame: np.ndarray, obj: ObjectFrame, color,
+                 scale: float = 1.0):
   if obj is not None:
-    cv2.ellipse(frame, center=obj.centroid, axes=obj.size, angle=0,
+    cv2.ellipse(frame, center=_scale_point(obj.centroid, scale),
+                axes=_scale_point(obj.size, scale), angle=0,
                 startAngle=0, endAngle=360, color=color, thickness = 2)
-  
 
-def play_experiment_video(participant_idx, video_idx, save_video=False):
-
-  video_idx_str = str(video_idx).zfill(2)
+def _scale_point(point, scale: float):
+  return (int(scale * point[0]), int(scale * point[1]))
+  
 
-  video_fname = VIDEO_DIR + video_idx_str + '.mp4'
-  video = cv2.VideoCapture(video_fname)
+def _video_fname(video_idx):
+  return VIDEO_DIR + str(video_idx).zfill(2) + '.mp4'
 
-  detected_objects_fname = DETECTED_OBJECTS_DIR + video_idx_str + '.pickle'
+def _load_detected_objects(video_idx):
+  detected_objects_fname = (DETECTED_OBJECTS_DIR + str(video_idx).zfill(2)
+                            + '.pickle')
   with open(detected_objects_fname, 'rb') as in_file:
     detected_objects = util.smooth_objects(pickle.load(in_file))
   util.align_objects_to_screen(video_idx, detected_objects)
+  return detected_objects
 
+def _load_participant_data(participant_idx, video_idx, detected_objects):
+  """Loads a participant's data for a video and decodes it with the HMM.
+
+  Returns:
+    (experiment_data, hmm_mle), where hmm_mle is the HMM estimate of the
+    object attended in each frame
+  """
   experiment_data = (load_and_preprocess_data
                      .load_participant(participant_idx)
                      .videos[video_idx-1])
 
   hmm_mle = hmm.forwards_backwards(SIGMA, TAU, experiment_data,
                                    detected_objects)
+  return experiment_data, hmm_mle
+
+def _load_video_data(participant_idx, video_idx):
+  """Loads the objects detected in a video and a participant's data for it.
+
+  Returns:
+    (detected_objects, experiment_data, hmm_mle), where hmm_mle is the HMM
+    estimate of the object attended in each frame
+  """
+  detected_objects = _load_detected_objects(video_idx)
+  experiment_data, hmm_mle = _load_participant_data(participant_idx,
+                                                    video_idx,
+                                                    detected_objects)
+  return detected_objects, experiment_data, hmm_mle
+
+def _draw_annotations(frame: np.ndarray, frame_idx: int, experiment_data,
+                      detected_objects, hmm_mle) -> bool:
+  """Draws gaze, detected objects, target and HMM estimate onto a frame.
+
+  Returns:
+    whether the HMM estimate matches the target in this frame
+  """
+  # Plot gaze
+  try:
+    gaze = tuple(int(x) for x in experiment_data.frames[frame_idx].gaze)
+    cv2.circle(frame, center=gaze, radius=10, color=(255, 255, 255),
+               thickness = 3)
+  except ValueError:
+    # When eye-tracking is missing, plot a red square in the top-left corner
+    cv2.rectangle(frame, (0, 0), (20, 20), (0, 0, 255), 20)
+
+  # Plot all detected objects
+  objects_in_frame = detected_objects[frame_idx]
+  for obj in objects_in_frame:
+    _plot_object(frame, obj, color=(255, 0, 0))
+
+  # Plot true target and HMM estimate
+  target = experiment_data.frames[frame_idx].target
+  hmm_estimate = hmm_mle[frame_idx]
+  hmm_is_correct = (target == hmm_estimate)
+  if hmm_is_correct:
+    # Plot estimated object in white
+    _plot_object(frame, hmm_estimate, color=(255, 255, 255))
+  else:
+    # Plot target object in red
+    _plot_object(frame, target, color=(0, 255, 0))
+    # Plot estimated object in green
+    _plot_object(frame, hmm_estimate, color=(0, 0, 255))
+  return hmm_is_correct
+
+def play_experiment_video(participant_idx, video_idx, save_video=False,
+                          headless=False,
+                          save_video_filename=SAVE_VIDEO_FILENAME,
+                          codec=SAVE_VIDEO_CODEC, save_video_fps=None,
+                          heatmaps_fname=None):
+  """Plays a stimulus video, overlaid with a participant's gaze, the detected
+  objects, the target and the HMM estimate.
+
+  Args:
+    participant_idx: ID of the participant whose data to overlay
+    video_idx: index (between 1-14, inclusive) of the stimulus video
+    save_video: whether to save the overlaid video to save_video_filename
+    headless: if True, render as fast as possible without displaying frames
+      or pacing them to the video's frame rate (e.g., to batch-render videos)
+    save_video_filename: file to which to save the overlaid video
+    codec: FourCC code of the codec with which to save the video
+    save_video_fps: frame rate of the saved video; defaults to the natural
+      frame rate of the stimulus video
+    heatmaps_fname: optional file of gaze heatmaps for this video, saved by
+      gaze_heatmaps.py, to blend onto the video
+  """
+
+  # Decode and rescale frames ahead of time on a background thread
+  rescale_video_to_screen = Letterbox(util.VIDEO_SIZES[video_idx - 1],
+                                      (SCREEN_HEIGHT, SCREEN_WIDTH))
+  video = PrefetchingVideoReader(_video_fname(video_idx),
+                                 transform=rescale_video_to_screen)
+
+  detected_objects, experiment_data, hmm_mle = _load_video_data(
+      participant_idx, video_idx)
+
+  heatmaps = None if heatmaps_fname is None else HeatmapBlender(heatmaps_fname)
 
   # Set the inter-frame delay based on the video's natural framerate
-  FPS = video.get(cv2.CAP_PROP_FPS) # natural frame rate
+  FPS = video.fps # natural frame rate
   print('Video framerate:' + str(FPS))
   delay = 1.0/FPS
 
@@ -73,66 +159,337 @@ def play_experiment_video(participant_idx, video_idx, save_video=False):
   videoStartTime = time.time()
   nextFrameExists, frame = video.read() # Load first video frame
 
-  # Keep track of HMM decoding performance
-  hmm_correct = []
-  last_switch_frame = 0
-  previous_target = experiment_data.frames[0].target
+  # Count frames displayed more than one frame late
+  num_late_frames = 0
 
   if save_video:
-    out = cv2.VideoWriter(SAVE_VIDEO_FILENAME, -1, FPS/3, (640,480))
-  
+    out = cv2.VideoWriter(save_video_filename,
+                          cv2.VideoWriter_fourcc(*codec),
+                          save_video_fps or FPS,
+                          (SCREEN_WIDTH, SCREEN_HEIGHT))
+
   while nextFrameExists and current_frame < len(experiment_data.frames):
-    if time.time() > videoStartTime + current_frame * delay:
-      frame = _rescale_video_to_screen(frame)
-
-      # Plot gaze
-      try:
-        gaze = tuple(int(x) for x in experiment_data.frames[current_frame].gaze)
-        cv2.circle(frame, center=gaze, radius=10, color=(255, 255, 255),
-                   thickness = 3)
-      except ValueError:
-        # When eye-tracking is missing, plot a red square in the top-left corner
-        cv2.rectangle(frame, (0, 0), (20, 20), (0, 0, 255), 20)
-        pass
-
-      # Plot all detected objects
-      objects_in_frame = detected_objects[current_frame]
-      for obj in objects_in_frame:
-        _plot_object(frame, obj, color=(255, 0, 0))
-
-      # Plot true target and HMM estimate
-      target = experiment_data.frames[current_frame].target
-      hmm_estimate = hmm_mle[current_frame]
-      hmm_is_correct = (target == hmm_estimate)
-      if hmm_is_correct:
-        # Plot estimated object in white
-        _plot_object(frame, hmm_estimate, color=(255, 255, 255))
-      else:
-        # Plot target object in red
-        _plot_object(frame, target, color=(0, 255, 0))
-        # Plot estimated object in green
-        _plot_object(frame, hmm_estimate, color=(0, 0, 255))
-
-      if target != previous_target:
-        previous_target = target
-        last_switch_frame = current_frame
-      if current_frame >= last_switch_frame + GRACE_PERIOD:
-        # Only count performance on frames outside the grace period
-        hmm_correct.append(hmm_is_correct)
+    if headless or time.time() > videoStartTime + current_frame * delay:
+      if heatmaps is not None:
+        heatmaps.blend(frame, current_frame)
+      _draw_annotations(frame, current_frame, experiment_data,
+                        detected_objects, hmm_mle)
 
       if save_video:
         out.write(frame)
-      cv2.imshow('Video Frame', frame) # Display current frame
-      cv2.waitKey(1)
+      if not headless:
+        if time.time() > videoStartTime + (current_frame + 1) * delay:
+          num_late_frames += 1
+        cv2.imshow('Video Frame', frame) # Display current frame
+        cv2.waitKey(1)
       nextFrameExists, frame = video.read() # Load next video frame
       current_frame += 1
 
   if save_video:
     out.release()
   video.release()
-  cv2.destroyAllWindows()
+  if not headless:
+    cv2.destroyAllWindows()
+
+  render_time = time.time() - videoStartTime
+  print('Rendered {} frames in {:.1f}s ({:.1f} frames/s).'
+        .format(current_frame, render_time, current_frame / render_time))
+  if not headless:
+    print('{} frames were displayed late; decoding stalled {} times.'
+          .format(num_late_frames, video.num_stalls))
+
+  # Only count performance on frames outside the grace period
+  video_metrics = metrics.compute_object_metrics(
+      hmm_mle[:current_frame],
+      [frame.target for frame in experiment_data.frames[:current_frame]])
+  print('HMM accuracy: {}'.format(video_metrics.accuracy))
+  print('Median switch latency: {} frames'.format(
+      np.median(video_metrics.switch_latencies)))
+  print('Confusion: {}'.format(video_metrics.confusion))
+
+def render_experiment_videos(participant_indices, video_indices,
+                             save_video_filename_format=SAVE_VIDEO_FILENAME_FORMAT,
+                             **kwargs):
+  """Headlessly renders and saves review videos for several participants.
+
+  Args:
+    participant_indices: IDs of participants whose videos to render
+    video_indices: indices (between 1-14, inclusive) of videos to render
+    save_video_filename_format: format of saved filenames, with fields
+      participant_idx and video_idx
+    kwargs: additional arguments to play_experiment_video
+  """
+  for participant_idx in participant_indices:
+    for video_idx in video_indices:
+      play_experiment_video(
+          participant_idx, video_idx, save_video=True, headless=True,
+          save_video_filename=save_video_filename_format.format(
+              participant_idx=participant_idx, video_idx=video_idx),
+          **kwargs)
+
+def _hmm_error_frames(experiment_data, hmm_mle):
+  """Returns indices of frames, outside the grace period after each target
+  switch, in which the HMM estimate differs from the target."""
+  predicted_ids = metrics.encode_objects(hmm_mle)
+  actual_ids = metrics.encode_objects(
+      [frame.target for frame in experiment_data.frames])
+  num_frames = min(len(predicted_ids), len(actual_ids))
+  is_error = (metrics.grace_period_mask(actual_ids)[:num_frames]
+              & (predicted_ids[:num_frames] != actual_ids[:num_frames]))
+  return np.flatnonzero(is_error).tolist()
+
+def _merge_into_segments(frame_indices, padding, num_frames):
+  """Pads each of a sorted list of frame indices and merges overlaps.
+
+  Returns:
+    list of (start_frame, end_frame) pairs, with end_frame exclusive
+  """
+  segments = []
+  for frame_idx in frame_indices:
+    start = max(0, frame_idx - padding)
+    end = min(num_frames, frame_idx + padding + 1)
+    if segments and start <= segments[-1][1]:
+      segments[-1] = (segments[-1][0], end)
+    else:
+      segments.append((start, end))
+  return segments
+
+def render_error_clips(participant_idx, video_idx, output_dir='.',
+                       padding=CLIP_PADDING, codec=SAVE_VIDEO_CODEC):
+  """Renders only the segments of a video in which the HMM is wrong.
+
+  Frames on which the HMM estimate differs from the target (outside the grace
+  period) are padded with padding frames of context and merged into segments.
+  Each segment is rendered to its own clip, by seeking directly to its first
+  frame, and the clips are listed in a CSV index file.
 
-  print('HMM accuracy: {}'.format(np.mean(hmm_correct)))
+  Args:
+    participant_idx: ID of the participant whose data to overlay
+    video_idx: index (between 1-14, inclusive) of the stimulus video
+    output_dir: directory in which to save the clips and index file
+    padding: number of frames of context before and after each error
+    codec: FourCC code of the codec with which to save the clips
+  """
+  render_start_time = time.time()
+  detected_objects, experiment_data, hmm_mle = _load_video_data(
+      participant_idx, video_idx)
+
+  error_frames = _hmm_error_frames(experiment_data, hmm_mle)
+  segments = _merge_into_segments(error_frames, padding,
+                                  len(experiment_data.frames))
+  print('Found {} HMM errors in {} segments.'.format(len(error_frames),
+                                                     len(segments)))
+
+  rescale_video_to_screen = Letterbox(util.VIDEO_SIZES[video_idx - 1],
+                                      (SCREEN_HEIGHT, SCREEN_WIDTH))
+  clip_prefix = '{:02d}_{:02d}'.format(participant_idx, video_idx)
+  index_fname = os.path.join(output_dir, clip_prefix + '_errors.csv')
+  with open(index_fname, 'w') as index_file:
+    writer = csv.writer(index_file, delimiter = ',')
+    writer.writerow(['Clip_Filename', 'Start_Frame', 'End_Frame',
+                     'Start_Time', 'End_Time', 'Num_Errors'])
+
+    for (clip_idx, (start, end)) in enumerate(segments):
+      video = PrefetchingVideoReader(_video_fname(video_idx),
+                                     transform=rescale_video_to_screen,
+                                     start_frame=start)
+      clip_fname = '{}_clip{:03d}.mp4'.format(clip_prefix, clip_idx)
+      out = cv2.VideoWriter(os.path.join(output_dir, clip_fname),
+                            cv2.VideoWriter_fourcc(*codec), video.fps,
+                            (SCREEN_WIDTH, SCREEN_HEIGHT))
+      for frame_idx in range(start, end):
+        frame_exists, frame = video.read()
+        if not frame_exists:
+          break
+        _draw_annotations(frame, frame_idx, experiment_data, detected_objects,
+                          hmm_mle)
+        out.write(frame)
+      out.release()
+      video.release()
+
+      num_errors = sum(start <= frame_idx < end for frame_idx in error_frames)
+      writer.writerow([clip_fname, start, end, start/video.fps,
+                       end/video.fps, num_errors])
+
+  print('Rendered {} clips in {:.1f}s; index written to {}.'
+        .format(len(segments), time.time() - render_start_time, index_fname))
+
+def _participant_colors(num_participants):
+  """Returns distinct (BGR) colors, evenly spaced in hue."""
+  hues = np.linspace(0, 180, num_participants, endpoint=False)
+  hsv = np.stack([hues, np.full(num_participants, 255),
+                  np.full(num_participants, 255)], axis=-1)
+  bgr = cv2.cvtColor(hsv.astype(np.uint8)[np.newaxis], cv2.COLOR_HSV2BGR)[0]
+  return [tuple(int(c) for c in color) for color in bgr]
+
+def _draw_participant(frame: np.ndarray, experiment_frame, hmm_estimate,
+                      color, scale: float = 1.0):
+  """Draws one participant's gaze and HMM estimate in the given color."""
+  if not experiment_frame.gaze_is_missing:
+    cv2.circle(frame, center=_scale_point(experiment_frame.gaze, scale),
+               radius=10, color=color, thickness = 3)
+  _plot_object(frame, hmm_estimate, color=color, scale=scale)
+
+def render_participants_overlay(participant_indices, video_idx,
+                                save_video_filename=SAVE_VIDEO_FILENAME,
+                                mosaic=False, codec=SAVE_VIDEO_CODEC,
+                                save_video_fps=None):
+  """Renders several participants' data over a single decode of a video.
+
+  Each participant's gaze and HMM estimate are drawn in a distinct color.
+  Since the video is only decoded and rescaled once, regardless of the number
+  of participants, this is much faster than rendering each participant
+  separately with play_experiment_video.
+
+  Args:
+    participant_indices: IDs of the participants whose data to overlay
+    video_idx: index (between 1-14, inclusive) of the stimulus video
+    save_video_filename: file to which to save the overlaid video
+    mosaic: if True, draw each participant on their own tile of a grid,
+      rather than all participants on a single frame
+    codec: FourCC code of the codec with which to save the video
+    save_video_fps: frame rate of the saved video; defaults to the natural
+      frame rate of the stimulus video
+  """
+  detected_objects = _load_detected_objects(video_idx)
+  participants_data = [_load_participant_data(participant_idx, video_idx,
+                                              detected_objects)
+                       for participant_idx in participant_indices]
+  colors = _participant_colors(len(participant_indices))
+  num_frames = min(len(experiment_data.frames)
+                   for (experiment_data, _) in participants_data)
+
+  if mosaic:
+    # Tile participants in a near-square grid, at the screen's aspect ratio
+    num_columns = math.ceil(math.sqrt(len(participant_indices)))
+    num_rows = math.ceil(len(participant_indices) / num_columns)
+    tile_scale = 1 / num_columns
+    tile_width = int(tile_scale * SCREEN_WIDTH)
+    tile_height = int(tile_scale * SCREEN_HEIGHT)
+    mosaic_frame = np.zeros((num_rows * tile_height,
+                             num_columns * tile_width, 3), np.uint8)
+    output_size = (num_columns * tile_width, num_rows * tile_height)
+  else:
+    tile_scale = 1.0
+    output_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+
+  rescale_video_to_screen = Letterbox(util.VIDEO_SIZES[video_idx - 1],
+                                      (SCREEN_HEIGHT, SCREEN_WIDTH))
+  video = PrefetchingVideoReader(_video_fname(video_idx),
+                                 transform=rescale_video_to_screen)
+  out = cv2.VideoWriter(save_video_filename, cv2.VideoWriter_fourcc(*codec),
+                        save_video_fps or video.fps, output_size)
+
+  render_start_time = time.time()
+  current_frame = 0
+  frame_exists, frame = video.read()
+  while frame_exists and current_frame < num_frames:
+    for obj in detected_objects[current_frame]:
+      _plot_object(frame, obj, color=(255, 0, 0))
+
+    if mosaic:
+      tile = cv2.resize(frame, (tile_width, tile_height))
+    for (participant_num, (experiment_data, hmm_mle)) \
+            in enumerate(participants_data):
+      if mosaic:
+        row, column = divmod(participant_num, num_columns)
+        frame = mosaic_frame[row * tile_height:(row + 1) * tile_height,
+                             column * tile_width:(column + 1) * tile_width]
+        frame[:] = tile
+      _draw_participant(frame, experiment_data.frames[current_frame],
+                        hmm_mle[current_frame], colors[participant_num],
+                        scale=tile_scale)
+      # Label each tile, or list all participants down the frame's left edge
+      cv2.putText(frame, 'Participant {}'.format(
+                      participant_indices[participant_num]),
+                  (10, 30 + (0 if mosaic else 30 * participant_num)),
+                  cv2.FONT_HERSHEY_SIMPLEX, 1, colors[participant_num], 2)
+
+    out.write(mosaic_frame if mosaic else frame)
+    frame_exists, frame = video.read()
+    current_frame += 1
+
+  out.release()
+  video.release()
+  render_time = time.time() - render_start_time
+  print('Rendered {} frames for {} participants in {:.1f}s ({:.1f} frames/s).'
+        .format(current_frame, len(participant_indices), render_time,
+                current_frame / render_time))
+
+def scrub_experiment_video(participant_idx, video_idx,
+                           max_cache_mb=SCRUB_CACHE_MB):
+  """Interactively steps through a video, overlaid as in play_experiment_video.
+
+  Keyboard controls:
+    space: play/pause
+    r: play backwards
+    d/a: step one frame forwards/backwards
+    l/j: seek one second forwards/backwards
+    q/Esc: quit
+
+  Decoded, rescaled frames are kept in an LRU cache, and annotations are drawn
+  on demand, so stepping back and forth around a frame does not decode it
+  again.
+
+  Args:
+    participant_idx: ID of the participant whose data to overlay
+    video_idx: index (between 1-14, inclusive) of the stimulus video
+    max_cache_mb: maximum memory (in MB) of decoded frames to cache
+  """
+  detected_objects, experiment_data, hmm_mle = _load_video_data(
+      participant_idx, video_idx)
+  # Cached frames are copied, so a single letterbox canvas suffices
+  rescale_video_to_screen = Letterbox(util.VIDEO_SIZES[video_idx - 1],
+                                      (SCREEN_HEIGHT, SCREEN_WIDTH),
+                                      num_buffers=1)
+  video = CachedFrameReader(_video_fname(video_idx),
+                            transform=rescale_video_to_screen,
+                            max_cache_bytes=max_cache_mb * 2**20)
+  num_frames = min(len(experiment_data.frames), video.num_frames)
+  frame_delay_ms = max(1, int(1000 / video.fps))
+  seek_frames = int(video.fps)
+
+  current_frame = 0
+  direction = 0 # 1 when playing, -1 when playing backwards, 0 when paused
+  while True:
+    cached_frame = video.read(current_frame)
+    if cached_frame is None:
+      break
+    frame = cached_frame.copy()
+    _draw_annotations(frame, current_frame, experiment_data, detected_objects,
+                      hmm_mle)
+    cv2.putText(frame, 'Frame {}/{}{}'.format(
+                    current_frame, num_frames - 1,
+                    '' if direction else ' (paused)'),
+                (30, SCREEN_HEIGHT - 30), cv2.FONT_HERSHEY_SIMPLEX, 1,
+                (255, 255, 255), 2)
+    cv2.imshow('Video Frame', frame)
+
+    key = cv2.waitKey(frame_delay_ms if direction else 0)
+    key = -1 if key == -1 else chr(key & 0xFF)
+    if key in ('q', chr(27)):
+      break
+    elif key == ' ':
+      direction = 0 if direction else 1
+    elif key == 'r':
+      direction = -1
+    elif key in ('d', 'a'):
+      direction = 0
+      current_frame += 1 if key == 'd' else -1
+    elif key in ('l', 'j'):
+      current_frame += seek_frames if key == 'l' else -seek_frames
+    else:
+      current_frame += direction
+
+    if not 0 <= current_frame < num_frames:
+      # Pause at either end of the video
+      current_frame = min(max(0, current_frame), num_frames - 1)
+      direction = 0
+
+  video.release()
+  cv2.destroyAllWindows()
+  print('Frame cache: {} hits, {} misses.'.format(video.num_hits,
+                                                  video.num_misses))
 
 
 if __name__ == '__main__':